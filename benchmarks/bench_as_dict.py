@@ -0,0 +1,65 @@
+"""Benchmark helpers.as_dict against a dataclasses.asdict based serializer.
+
+Run with: `uv run python benchmarks/bench_as_dict.py`
+"""
+
+import dataclasses
+import inspect
+import time
+from typing import Any
+
+from mqtt_entity import MQTTSensorEntity
+from mqtt_entity.helpers import as_dict
+
+ENTITIES = 10000
+ROUNDS = 5
+
+
+def as_dict_asdict(obj: Any) -> dict[str, Any]:
+    """Serialize with dataclasses.asdict & a per field filter."""
+
+    def _filter(atrb: dataclasses.Field, value: Any) -> bool:
+        if not value or atrb.default == value:
+            return False
+        if atrb.metadata.get("internal") or atrb.name == "discovery_extra":
+            return False
+        return not inspect.isfunction(value)
+
+    res = {
+        k: v
+        for k, v in dataclasses.asdict(obj).items()
+        if _filter(obj.__dataclass_fields__[k], v)
+    }
+    res.update(obj.discovery_extra)
+    return res
+
+
+def bench(func: Any, ents: list[MQTTSensorEntity]) -> float:
+    """Serialize all entities. Return the duration."""
+    start = time.perf_counter()
+    for ent in ents:
+        func(ent)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    ents = [
+        MQTTSensorEntity(
+            name=f"Sensor {idx}",
+            unique_id=f"s{idx}",
+            state_topic=f"dev/s{idx}",
+            unit_of_measurement="W",
+            device_class="power",
+            suggested_display_precision=1,
+        )
+        for idx in range(ENTITIES)
+    ]
+    assert as_dict(ents[0]) == as_dict_asdict(ents[0])
+    for name, func in (("asdict", as_dict_asdict), ("as_dict", as_dict)):
+        best = min(bench(func, ents) for _ in range(ROUNDS))
+        print(f"{name:<8} {best * 1000:>10.2f} ms  ({ENTITIES} entities)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark building the discovery payloads of many devices.
+
+Compares a full rebuild (as on every Home Assistant restart before caching)
+with the cached MQTTDevice.discovery_payload.
+
+Run with: `uv run python benchmarks/bench_discovery.py`
+"""
+
+import time
+
+from mqtt_entity import MQTTDevice, MQTTSensorEntity
+from mqtt_entity.device import MQTTOrigin
+
+DEVICES = 300
+ENTITIES = 40
+ROUNDS = 3
+
+
+def make_devices() -> list[MQTTDevice]:
+    """Create devices with sensor entities."""
+    return [
+        MQTTDevice(
+            identifiers=[f"dev{d}"],
+            name=f"Device {d}",
+            components={
+                f"dev{d}_s{e}": MQTTSensorEntity(
+                    name=f"Sensor {e}",
+                    unique_id=f"dev{d}_s{e}",
+                    state_topic=f"dev{d}/s{e}",
+                    unit_of_measurement="W",
+                    device_class="power",
+                    suggested_display_precision=1,
+                )
+                for e in range(ENTITIES)
+            },
+        )
+        for d in range(DEVICES)
+    ]
+
+
+def bench(devs: list[MQTTDevice], origin: MQTTOrigin, *, rebuild: bool) -> float:
+    """Build the payloads of all devices. Return the duration."""
+    start = time.perf_counter()
+    for dev in devs:
+        if rebuild:
+            dev.invalidate_discovery()
+        dev.discovery_payload("avail", origin=origin)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    devs = make_devices()
+    origin = MQTTOrigin(name="bench")
+    for name, rebuild in (("rebuild", True), ("cached", False)):
+        best = min(bench(devs, origin, rebuild=rebuild) for _ in range(ROUNDS))
+        print(
+            f"{name:<8} {best * 1000:>10.2f} ms  ({DEVICES} devices x {ENTITIES} entities)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark inbound message dispatch in MQTTAsyncClient._mqtt_on_message.
+
+Messages are fed directly to the paho on_message handler, so the results show
+the matching & dispatch overhead per message.
+
+Run with: `uv run python benchmarks/bench_dispatch.py`
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from paho.mqtt.client import MQTTMessage
+
+from mqtt_entity.client import MQTTAsyncClient
+
+MESSAGES = 20000
+ROUNDS = 5
+
+
+def on_payload(payload: str, _: str) -> None:
+    """Sync callback that ignores the topic."""
+
+
+def on_payload_topic(payload: str, topic: str) -> None:
+    """Sync callback with payload & topic arguments."""
+
+
+async def on_async(payload: str, topic: str) -> None:
+    """Async callback."""
+
+
+def make_message(topic: str, payload: bytes) -> MQTTMessage:
+    """Create a paho message."""
+    msg = MQTTMessage(topic=topic.encode())
+    msg.payload = payload
+    return msg
+
+
+def bench_dispatch(mqc: MQTTAsyncClient, messages: list[MQTTMessage]) -> float:
+    """Dispatch all messages. Return the duration."""
+    start = time.perf_counter()
+    for msg in messages:
+        mqc._mqtt_on_message(mqc.client, None, msg)
+    return time.perf_counter() - start
+
+
+async def bench_async_dispatch(
+    mqc: MQTTAsyncClient, messages: list[MQTTMessage]
+) -> tuple[float, int]:
+    """Dispatch all messages from a thread, as paho would.
+
+    Return the duration until all async callbacks ran & the loop wakeups.
+    """
+    loop = asyncio.get_running_loop()
+    mqc._loop = loop
+    done = asyncio.Event()
+    remaining = len(messages)
+
+    async def on_count(payload: str, topic: str) -> None:
+        nonlocal remaining
+        remaining -= 1
+        if not remaining:
+            done.set()
+
+    mqc.topic_subscribe("bench/+/set", on_count)
+    with patch.object(
+        loop, "call_soon_threadsafe", wraps=loop.call_soon_threadsafe
+    ) as wakeups:
+        start = time.perf_counter()
+        thread = threading.Thread(target=bench_dispatch, args=(mqc, messages))
+        thread.start()
+        await done.wait()
+        duration = time.perf_counter() - start
+        thread.join()
+    return duration, wakeups.call_count
+
+
+def make_client() -> MQTTAsyncClient:
+    """Create a client that does not subscribe on the broker."""
+    mqc = MQTTAsyncClient()
+    # patched for the lifetime of the client
+    patch.object(mqc.client, "subscribe", return_value=(0, 0)).start()
+    return mqc
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    mqc = make_client()
+    for idx in range(100):
+        mqc.topic_subscribe(f"bench/{idx}/set", on_payload_topic)
+    mqc.topic_subscribe("bench/+/set", on_payload)
+
+    messages = [make_message(f"bench/{i % 100}/set", b"42") for i in range(MESSAGES)]
+    best = min(bench_dispatch(mqc, messages) for _ in range(ROUNDS))
+    print(f"dispatch {MESSAGES / best:>12,.0f} msg/s  (2 sync callbacks per message)")
+
+    mqc = make_client()
+    for idx in range(100):
+        mqc.topic_subscribe(f"bench/{idx}/set", on_async)
+    results = [asyncio.run(bench_async_dispatch(mqc, messages)) for _ in range(ROUNDS)]
+    best, wakeups = min(results)
+    print(
+        f"dispatch {MESSAGES / best:>12,.0f} msg/s  (2 async callbacks per message,"
+        f" {wakeups} loop wakeups)"
+    )
+
+
+if __name__ == "__main__":
+    main()
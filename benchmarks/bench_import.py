@@ -0,0 +1,73 @@
+"""Benchmark the import time of mqtt_entity with `python -X importtime`.
+
+Each statement runs in a fresh interpreter, the best of ROUNDS is reported.
+Exits with an error if `import mqtt_entity` exceeds BUDGET_MS or loads one of
+the HEAVY dependencies.
+
+Run with: `uv run python benchmarks/bench_import.py`
+"""
+
+import re
+import subprocess
+import sys
+
+ROUNDS = 7
+BUDGET_MS = 30
+HEAVY = ("paho", "aiohttp", "cattrs", "yaml")
+
+STATEMENTS = (
+    "import mqtt_entity",
+    "from mqtt_entity import MQTTDevice, MQTTSensorEntity",
+    "from mqtt_entity.options import MQTTOptions",
+    "from mqtt_entity import MQTTClient",
+)
+
+LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_stderr(statement: str) -> str:
+    """Run the statement in a fresh interpreter. Return the importtime report."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return res.stderr
+
+
+def import_time(statement: str, startup: set[str]) -> tuple[float, set[str]]:
+    """Return the cumulative import time in ms & the heavy packages loaded.
+
+    Modules imported by the interpreter startup are not counted.
+    """
+    total = 0
+    loaded = set[str]()
+    for match in LINE.finditer(import_stderr(statement)):
+        cumulative, indent, name = match.groups()
+        if not indent and name not in startup:  # top level imports of the statement
+            total += int(cumulative)
+        if name.split(".")[0] in HEAVY:
+            loaded.add(name.split(".")[0])
+    return total / 1000, loaded
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    startup = {m.group(3) for m in LINE.finditer(import_stderr("pass"))}
+    ok = True
+    for statement in STATEMENTS:
+        results = [import_time(statement, startup) for _ in range(ROUNDS)]
+        best = min(r[0] for r in results)
+        loaded = results[0][1]
+        print(
+            f"{best:>8.2f} ms  {statement}  (loads {', '.join(sorted(loaded)) or '-'})"
+        )
+        if statement == STATEMENTS[0]:
+            ok = best <= BUDGET_MS and not loaded
+    if not ok:
+        sys.exit(f"`{STATEMENTS[0]}` over the {BUDGET_MS} ms budget or loads {HEAVY}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Benchmark MQTTMatcher2.iter_match as the number of subscriptions grows.
+
+Run with: `uv run python benchmarks/bench_matcher.py`
+"""
+
+import time
+
+from mqtt_entity.client import MQTTMatcher2
+
+LOOKUPS = 20000
+ROUNDS = 5
+
+
+def make_matcher(count: int) -> MQTTMatcher2:
+    """Create a matcher with literal command topics & two wildcard filters."""
+    mat = MQTTMatcher2()
+    for idx in range(count):
+        mat[f"dev{idx % 100}/sensor_{idx}/set"] = idx
+    mat["dev0/+/set"] = "wildcard"
+    mat["homeassistant/#"] = "wildcard"
+    return mat
+
+
+def bench_match(mat: MQTTMatcher2, topics: list[str]) -> float:
+    """Match all topics. Return the duration."""
+    start = time.perf_counter()
+    for topic in topics:
+        for _ in mat.iter_match(topic):
+            pass
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmarks."""
+    for count in (10, 1000, 10000, 50000):
+        mat = make_matcher(count)
+        topics = [f"dev{i % 100}/sensor_{i % count}/set" for i in range(LOOKUPS)]
+        best = min(bench_match(mat, topics) for _ in range(ROUNDS))
+        print(f"iter_match {count:>6} subscriptions {LOOKUPS / best:>12,.0f} match/s")
+
+
+if __name__ == "__main__":
+    main()
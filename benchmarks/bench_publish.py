@@ -0,0 +1,67 @@
+"""Benchmark MQTTAsyncClient.publish against MQTTAsyncClient.publish_many.
+
+Paho is replaced by a no-op publish, so the results show the client overhead
+(argument checks, connection checks & thread hops) per message.
+
+Run with: `uv run python benchmarks/bench_publish.py`
+"""
+
+import asyncio
+import time
+from typing import Any
+from unittest.mock import patch
+
+from paho.mqtt.client import MQTTMessageInfo
+
+from mqtt_entity.client import MQTTAsyncClient
+
+MESSAGES = 2000
+ROUNDS = 5
+
+
+def make_client() -> MQTTAsyncClient:
+    """Create a client that is always connected and discards messages."""
+    mqc = MQTTAsyncClient()
+    mqc.connect_time = 1
+
+    info = MQTTMessageInfo(0)
+
+    def publish(*_: Any) -> MQTTMessageInfo:
+        return info
+
+    # patched for the lifetime of the client
+    patch.object(mqc.client, "is_connected", lambda: True).start()
+    patch.object(mqc.client, "publish", publish).start()
+    return mqc
+
+
+async def bench_publish(mqc: MQTTAsyncClient) -> float:
+    """Publish one message at a time. Return the duration."""
+    start = time.perf_counter()
+    for idx in range(MESSAGES):
+        await mqc.publish(f"bench/sensor_{idx}", str(idx))
+    return time.perf_counter() - start
+
+
+async def bench_publish_many(mqc: MQTTAsyncClient) -> float:
+    """Publish all messages as a batch. Return the duration."""
+    start = time.perf_counter()
+    await mqc.publish_many(
+        (f"bench/sensor_{idx}", str(idx), 0, False) for idx in range(MESSAGES)
+    )
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    """Run the benchmarks."""
+    mqc = make_client()
+    for name, bench in (
+        ("publish", bench_publish),
+        ("publish_many", bench_publish_many),
+    ):
+        best = min([await bench(mqc) for _ in range(ROUNDS)])
+        print(f"{name:<14} {MESSAGES / best:>12,.0f} msg/s  ({MESSAGES} messages)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,251 @@
+"""Benchmark suite for the publish, dispatch, matcher, discovery & utils hot paths.
+
+Prints a table and optionally writes the results as JSON. Compare with a
+previous JSON file to find regressions between releases, the exit code is 1 if
+a benchmark is slower than the threshold.
+
+Run with: `uv run python benchmarks/suite.py --json results.json`
+Compare with: `uv run python benchmarks/suite.py --compare results.json`
+"""
+
+import argparse
+import asyncio
+import importlib.metadata
+import json
+import platform
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from json import dumps
+from pathlib import Path
+from typing import Any
+
+import bench_dispatch
+import bench_matcher
+import bench_publish
+
+from mqtt_entity import MQTTDevice, MQTTSensorEntity, MQTTSwitchEntity
+from mqtt_entity.device import MQTTOrigin
+from mqtt_entity.utils import load_json, tostr
+
+type Case = tuple[str, int, Callable[[], float]]
+"""Name, operations per run & a run that returns its duration."""
+
+
+@dataclass
+class Result:
+    """Best result of a benchmark."""
+
+    name: str
+    ops: int
+    ns_per_op: float
+
+    @property
+    def ops_per_sec(self) -> float:
+        """Operations per second."""
+        return 1e9 / self.ns_per_op
+
+
+def loop_timer(func: Callable[[], Any], number: int) -> Callable[[], float]:
+    """Return a run that calls func number times."""
+
+    def run() -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+    return run
+
+
+def publish_cases() -> Iterator[Case]:
+    """MQTTAsyncClient.publish & publish_many throughput, paho is a no-op."""
+    mqc = bench_publish.make_client()
+    for name, bench in (
+        ("publish", bench_publish.bench_publish),
+        ("publish_many", bench_publish.bench_publish_many),
+    ):
+        yield name, bench_publish.MESSAGES, lambda b=bench: asyncio.run(b(mqc))
+
+
+def dispatch_cases() -> Iterator[Case]:
+    """_mqtt_on_message with sync, async & wildcard callbacks."""
+    count = bench_dispatch.MESSAGES
+    messages = [
+        bench_dispatch.make_message(f"bench/{i % 100}/set", b"42") for i in range(count)
+    ]
+
+    mqc = bench_dispatch.make_client()
+    for idx in range(100):
+        mqc.topic_subscribe(f"bench/{idx}/set", bench_dispatch.on_payload_topic)
+    yield "dispatch_sync", count, lambda: bench_dispatch.bench_dispatch(mqc, messages)
+
+    amqc = bench_dispatch.make_client()
+    for idx in range(100):
+        amqc.topic_subscribe(f"bench/{idx}/set", bench_dispatch.on_async)
+
+    def run_async() -> float:
+        return asyncio.run(bench_dispatch.bench_async_dispatch(amqc, messages))[0]
+
+    yield "dispatch_async", count, run_async
+
+    wmqc = bench_dispatch.make_client()
+    wmqc.topic_subscribe("bench/+/set", bench_dispatch.on_payload_topic)
+    wmqc.topic_subscribe("bench/#", bench_dispatch.on_payload)
+    yield (
+        "dispatch_wildcard",
+        count,
+        lambda: bench_dispatch.bench_dispatch(wmqc, messages),
+    )
+
+
+def matcher_cases() -> Iterator[Case]:
+    """MQTTMatcher2.iter_match with a growing number of subscriptions."""
+    lookups = bench_matcher.LOOKUPS
+    for count in (10, 1000, 10000, 50000):
+        mat = bench_matcher.make_matcher(count)
+        topics = [f"dev{i % 100}/sensor_{i % count}/set" for i in range(lookups)]
+        yield (
+            f"iter_match_{count}",
+            lookups,
+            lambda m=mat, t=topics: bench_matcher.bench_match(m, t),
+        )
+
+
+def make_fleet(entities: int, per_device: int = 10) -> list[MQTTDevice]:
+    """Create devices with a mix of sensor & switch entities."""
+    devs = []
+    for did in range(max(1, entities // per_device)):
+        cmps: dict[str, Any] = {}
+        for eid in range(min(per_device, entities)):
+            uid = f"d{did}_e{eid}"
+            cmps[uid] = (
+                MQTTSwitchEntity(
+                    name=f"Switch {eid}",
+                    unique_id=uid,
+                    state_topic=f"d{did}/{uid}",
+                    command_topic=f"d{did}/{uid}/set",
+                    on_command=bench_dispatch.on_payload_topic,
+                )
+                if eid % 4 == 0
+                else MQTTSensorEntity(
+                    name=f"Sensor {eid}",
+                    unique_id=uid,
+                    state_topic=f"d{did}/{uid}",
+                    unit_of_measurement="W",
+                    device_class="power",
+                )
+            )
+        devs.append(MQTTDevice(identifiers=[f"d{did}"], components=cmps))
+    return devs
+
+
+def discovery_cases() -> Iterator[Case]:
+    """MQTTDevice.discovery_info & json.dumps for fleets, per entity."""
+    origin = MQTTOrigin(name="bench")
+    for entities in (10, 100, 1000, 10000):
+        devs = make_fleet(entities)
+
+        def run(devs: list[MQTTDevice] = devs) -> float:
+            start = time.perf_counter()
+            for dev in devs:
+                dumps(dev.discovery_info("avail", origin=origin)[1])
+            return time.perf_counter() - start
+
+        yield f"discovery_info_{entities}", entities, run
+
+
+def utils_cases() -> Iterator[Case]:
+    """Per call cost of utils.tostr & utils.load_json."""
+    number = 20000
+    for name, val in (("float", 3.14159), ("int", 42), ("bool", True)):
+        yield f"tostr_{name}", number, loop_timer(lambda v=val: tostr(v), number)
+    for name, msg in (("dict", '{"state": "ON", "brightness": 255}'), ("str", "ON")):
+        yield (
+            f"load_json_{name}",
+            number,
+            loop_timer(lambda m=msg: load_json(m), number),
+        )
+
+
+GROUPS = (publish_cases, dispatch_cases, matcher_cases, discovery_cases, utils_cases)
+
+
+def run_cases(rounds: int, select: str) -> list[Result]:
+    """Run the selected benchmarks. Return the best result of each."""
+    results = []
+    for group in GROUPS:
+        for name, ops, run in group():
+            if select not in name:
+                continue
+            best = min(run() for _ in range(rounds))
+            res = Result(name=name, ops=ops, ns_per_op=best * 1e9 / ops)
+            results.append(res)
+            print(
+                f"{name:<22} {res.ns_per_op:>12,.0f} ns/op {res.ops_per_sec:>14,.0f} op/s"
+            )
+    return results
+
+
+def metadata() -> dict[str, Any]:
+    """Describe the environment of the results."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "mqtt_entity": importlib.metadata.version("mqtt-entity"),
+        "paho_mqtt": importlib.metadata.version("paho-mqtt"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(results: list[Result], path: Path, threshold: float) -> bool:
+    """Print the change against previous results. Return False on regressions."""
+    previous = {
+        r["name"]: r["ns_per_op"] for r in json.loads(path.read_text())["results"]
+    }
+    ok = True
+    for res in results:
+        if res.name not in previous:
+            continue
+        change = (res.ns_per_op / previous[res.name] - 1) * 100
+        flag = ""
+        if change > threshold:
+            flag, ok = "  REGRESSION", False
+        print(f"{res.name:<22} {change:>+8.1f}%{flag}")
+    return ok
+
+
+def main() -> None:
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    parser.add_argument("--compare", type=Path, help="compare with previous results")
+    parser.add_argument(
+        "--threshold", type=float, default=10, help="regression threshold in %%"
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="runs per benchmark")
+    parser.add_argument("-k", dest="select", default="", help="run matching names")
+    args = parser.parse_args()
+
+    results = run_cases(args.rounds, args.select)
+    if args.json:
+        data = {"meta": metadata(), "results": [asdict(r) for r in results]}
+        args.json.write_text(json.dumps(data, indent=2) + "\n")
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
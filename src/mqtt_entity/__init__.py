@@ -1,20 +1,47 @@
-"""mqtt-entity library."""
-
-from mqtt_entity.client import MQTTClient, TopicCallback
-from mqtt_entity.device import MQTTDevice
-from mqtt_entity.entities import (
-    MQTTBaseEntity,
-    MQTTBinarySensorEntity,
-    MQTTDeviceTrigger,
-    MQTTEntity,
-    MQTTLightEntity,
-    MQTTNumberEntity,
-    MQTTRWEntity,
-    MQTTSelectEntity,
-    MQTTSensorEntity,
-    MQTTSwitchEntity,
-    MQTTTextEntity,
-)
+"""mqtt-entity library.
+
+The public names are imported on first access, so importing the package does
+not load paho-mqtt until the client is used.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from mqtt_entity.client import MQTTClient, TopicCallback
+    from mqtt_entity.device import MQTTDevice
+    from mqtt_entity.dispatch import TopicDispatcher
+    from mqtt_entity.entities import (
+        MQTTBaseEntity,
+        MQTTBinarySensorEntity,
+        MQTTDeviceTrigger,
+        MQTTEntity,
+        MQTTLightEntity,
+        MQTTNumberEntity,
+        MQTTRWEntity,
+        MQTTSelectEntity,
+        MQTTSensorEntity,
+        MQTTSwitchEntity,
+        MQTTTextEntity,
+    )
+
+_MODULES = {
+    "MQTTBaseEntity": "entities",
+    "MQTTBinarySensorEntity": "entities",
+    "MQTTClient": "client",
+    "MQTTDevice": "device",
+    "MQTTDeviceTrigger": "entities",
+    "MQTTEntity": "entities",
+    "MQTTLightEntity": "entities",
+    "MQTTNumberEntity": "entities",
+    "MQTTRWEntity": "entities",
+    "MQTTSelectEntity": "entities",
+    "MQTTSensorEntity": "entities",
+    "MQTTSwitchEntity": "entities",
+    "MQTTTextEntity": "entities",
+    "TopicCallback": "client",
+    "TopicDispatcher": "dispatch",
+}
 
 __all__ = [
     "MQTTBaseEntity",
@@ -31,4 +58,20 @@ __all__ = [
     "MQTTSwitchEntity",
     "MQTTTextEntity",
     "TopicCallback",
+    "TopicDispatcher",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    """Import a public name from its module on first access."""
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__() -> list[str]:
+    """List the public names."""
+    return sorted([*globals(), *__all__])
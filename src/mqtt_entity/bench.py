@@ -0,0 +1,322 @@
+"""Load generator for capacity planning.
+
+Run with: `python -m mqtt_entity.bench --devices 20 --entities 50 --rate 1000`
+
+Creates synthetic devices with a mix of entities on an MQTTClient, publishes
+their discovery & states at the target rate and sends commands to their
+command topics from a second client, which acts as Home Assistant. Reports the
+latency percentiles of state publishes, commands, command round trips
+(command to state echo) & discovery. Use --local for an in-process broker.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+from itertools import count
+from pathlib import Path
+from typing import Any
+
+from .broker import MQTTBroker
+from .client import AsyncCallback, MQTTAsyncClient, MQTTClient
+from .device import MQTTDevice
+from .entities import (
+    MQTTBinarySensorEntity,
+    MQTTEntity,
+    MQTTNumberEntity,
+    MQTTRWEntity,
+    MQTTSensorEntity,
+    MQTTSwitchEntity,
+)
+
+
+@dataclass
+class Latency:
+    """Latency samples in seconds."""
+
+    samples: list[float] = field(default_factory=list)
+
+    def percentile(self, pct: float) -> float:
+        """Return the percentile in ms (nearest rank)."""
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[idx] * 1000
+
+    def summary(self) -> dict[str, float]:
+        """Return the count & percentiles in ms."""
+        if not self.samples:
+            return {"count": 0}
+        return {
+            "count": len(self.samples),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": max(self.samples) * 1000,
+        }
+
+
+@dataclass
+class LoadTest:
+    """Publish states & send commands at a target rate, measure the latency."""
+
+    devices: int = 10
+    entities: int = 20
+    """Entities per device: sensors, binary sensors, switches & numbers."""
+    rate: float = 100
+    """State publishes per second, over all entities."""
+    command_rate: float = 10
+    """Commands per second, over all command topics."""
+    duration: float = 10
+    prefix: str = "mqtt-entity-bench"
+    native_loop: bool = False
+
+    latency: dict[str, Latency] = field(default_factory=dict)
+    sent: dict[str, int] = field(default_factory=dict)
+    client: MQTTClient = field(init=False, repr=False)
+    """The client of the devices."""
+    hass: MQTTAsyncClient = field(init=False, repr=False)
+    """The client that acts as Home Assistant."""
+
+    _seq: count = field(default_factory=count, repr=False)
+    _state_sent: dict[str, float] = field(default_factory=dict, repr=False)
+    _command_sent: dict[str, float] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        """Init the latency samples."""
+        for name in ("publish", "command", "round_trip", "discovery"):
+            self.latency[name] = Latency()
+
+    def make_devices(self) -> list[MQTTDevice]:
+        """Create the synthetic devices."""
+        devs = []
+        for did in range(self.devices):
+            dev_id = f"bench{did}"
+            cmps: dict[str, Any] = {}
+            for eid in range(self.entities):
+                uid = f"{dev_id}_e{eid}"
+                kwargs: dict[str, Any] = {
+                    "name": f"Entity {eid}",
+                    "unique_id": uid,
+                    "state_topic": f"{self.prefix}/state/{dev_id}/{uid}",
+                }
+                cmd_topic = f"{self.prefix}/set/{dev_id}/{uid}"
+                match eid % 4:
+                    case 0:
+                        ent: MQTTEntity = MQTTSensorEntity(**kwargs)
+                    case 1:
+                        ent = MQTTBinarySensorEntity(**kwargs)
+                    case 2:
+                        ent = MQTTSwitchEntity(**kwargs, command_topic=cmd_topic)
+                    case _:
+                        ent = MQTTNumberEntity(**kwargs, command_topic=cmd_topic)
+                if isinstance(ent, MQTTRWEntity):
+                    ent.on_command = self._on_command_factory(ent)
+                cmps[uid] = ent
+            devs.append(MQTTDevice(identifiers=[dev_id], components=cmps))
+        return devs
+
+    def _on_command_factory(self, ent: MQTTEntity) -> AsyncCallback:
+        """Create a command callback that echoes the command as the state."""
+
+        async def on_command(payload: str, topic: str) -> None:
+            if sent := self._command_sent.get(payload):
+                self.latency["command"].samples.append(time.perf_counter() - sent)
+            await ent.send_state(self.client, payload)
+
+        return on_command
+
+    def _on_state(self, payload: str, topic: str) -> None:
+        """Record the latency of a state or a command echo (paho's thread)."""
+        now = time.perf_counter()
+        if sent := self._command_sent.pop(payload, None):
+            self.latency["round_trip"].samples.append(now - sent)
+        elif sent := self._state_sent.pop(payload, None):
+            self.latency["publish"].samples.append(now - sent)
+
+    async def run(self, **connect: Any) -> dict[str, Any]:
+        """Run the load test. Return the results."""
+        devs = self.make_devices()
+        self.client = client = MQTTClient(
+            devs=devs,
+            availability_topic=f"{self.prefix}/status",
+            clean_entities=0,
+            track_delivery=True,
+            native_loop=self.native_loop,
+        )
+        self.hass = hass = MQTTAsyncClient(native_loop=self.native_loop)
+        await client.connect(**connect, wait_connected=True)
+        await hass.connect(**connect, wait_connected=True)
+        hass.topic_subscribe(f"{self.prefix}/state/#", self._on_state)
+        try:
+            await self._discovery(hass, devs)
+            states = [
+                e
+                for d in devs
+                for e in d.components.values()
+                if isinstance(e, MQTTEntity)
+            ]
+            commands = [e for e in states if isinstance(e, MQTTRWEntity)]
+            start = time.perf_counter()
+            await asyncio.gather(
+                self._generate("states", states, self.rate, self._send_state),
+                self._generate(
+                    "commands", commands, self.command_rate, self._send_command
+                ),
+            )
+            elapsed = time.perf_counter() - start
+            await asyncio.sleep(1)  # in flight messages
+        finally:
+            await self._remove_discovery(devs)
+            await hass.disconnect()
+            await client.disconnect()
+
+        return {
+            "config": {
+                "devices": self.devices,
+                "entities": self.entities,
+                "rate": self.rate,
+                "command_rate": self.command_rate,
+                "duration": self.duration,
+                "native_loop": self.native_loop,
+            },
+            "achieved": {k: v / elapsed for k, v in self.sent.items()},
+            "lost": {
+                "states": len(self._state_sent),
+                "commands": len(self._command_sent),
+            },
+            "latency": {k: v.summary() for k, v in self.latency.items()},
+        }
+
+    async def _discovery(self, hass: MQTTAsyncClient, devs: list[MQTTDevice]) -> None:
+        """Publish the discovery info, measure until hass received each device."""
+        pending = {f"homeassistant/device/{d.id}/config" for d in devs}
+        done = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        def on_discovery(payload: str, topic: str) -> None:
+            if payload and topic in pending:
+                pending.discard(topic)
+                self.latency["discovery"].samples.append(time.perf_counter() - start)
+                if not pending:
+                    loop.call_soon_threadsafe(done.set)
+
+        hass.topic_subscribe("homeassistant/device/+/config", on_discovery)
+        # The discovery info is not retained: a round trip ensures the broker
+        # processed the subscription before it is published
+        await hass.scan_retained()
+        await self.client.publish_discovery_info()
+        try:
+            async with asyncio.timeout(30):
+                await done.wait()
+        finally:
+            hass.topic_unsubscribe("homeassistant/device/+/config")
+
+    async def _remove_discovery(self, devs: list[MQTTDevice]) -> None:
+        """Remove the devices from Home Assistant."""
+        await self.client.publish_many(
+            (f"homeassistant/device/{d.id}/config", None, 1, True) for d in devs
+        )
+
+    async def _send_state(self, ent: MQTTEntity, seq: str) -> None:
+        """Publish a state from the device."""
+        self._state_sent[seq] = time.perf_counter()
+        await ent.send_state(self.client, seq)
+
+    async def _send_command(self, ent: MQTTEntity, seq: str) -> None:
+        """Publish a command from Home Assistant."""
+        assert isinstance(ent, MQTTRWEntity)
+        self._command_sent[seq] = time.perf_counter()
+        await self.hass.publish(ent.command_topic, seq)
+
+    async def _generate(
+        self,
+        name: str,
+        ents: Sequence[MQTTEntity],
+        rate: float,
+        send: Callable[[MQTTEntity, str], Awaitable[None]],
+    ) -> None:
+        """Send states or commands to the entities at the rate, round robin."""
+        self.sent[name] = 0
+        if not ents or rate <= 0:
+            return
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < self.duration:
+            for _ in range(int(elapsed * rate) - self.sent[name]):
+                ent = ents[self.sent[name] % len(ents)]
+                await send(ent, str(next(self._seq)))
+                self.sent[name] += 1
+            await asyncio.sleep(0.005)
+
+
+def print_results(res: dict[str, Any]) -> None:
+    """Print the results as a table."""
+    cfg = res["config"]
+    print(f"{cfg['devices']} devices x {cfg['entities']} entities, {cfg['duration']}s")
+    for name, val in res["achieved"].items():
+        lost = res["lost"].get(name, 0)
+        print(f"{name:<10} {val:>10,.1f}/s  (lost {lost})")
+    for name, lat in res["latency"].items():
+        if not lat["count"]:
+            continue
+        print(
+            f"{name:<10} n={lat['count']:<8} p50={lat['p50']:.2f}ms"
+            f" p90={lat['p90']:.2f}ms p99={lat['p99']:.2f}ms max={lat['max']:.2f}ms"
+        )
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    """Run the load test against the broker."""
+    test = LoadTest(
+        devices=args.devices,
+        entities=args.entities,
+        rate=args.rate,
+        command_rate=args.command_rate,
+        duration=args.duration,
+        native_loop=args.native_loop,
+    )
+    connect = {
+        "host": args.host,
+        "port": args.port,
+        "username": args.username,
+        "password": args.password,
+    }
+    if not args.local:
+        return await test.run(**connect)
+    async with MQTTBroker() as broker:
+        connect.update(host=broker.host, port=broker.port)
+        return await test.run(**connect)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Parse the arguments & run the load test."""
+    parser = argparse.ArgumentParser(
+        prog="python -m mqtt_entity.bench", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument("--host", default=os.getenv("MQTT_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MQTT_PORT", "1883")))
+    parser.add_argument("--username", default=os.getenv("MQTT_USERNAME", ""))
+    parser.add_argument("--password", default=os.getenv("MQTT_PASSWORD", ""))
+    parser.add_argument("--local", action="store_true", help="in-process broker")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--entities", type=int, default=20, help="per device")
+    parser.add_argument("--rate", type=float, default=100, help="states/s")
+    parser.add_argument("--command-rate", type=float, default=10, help="commands/s")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--native-loop", action="store_true")
+    parser.add_argument("--json", type=Path, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    res = asyncio.run(run(args))
+    print_results(res)
+    if args.json:
+        args.json.write_text(json.dumps(res, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""Minimal in-process MQTT 3.1.1 broker, for tests and benchmarks."""
+
+import asyncio
+import logging
+import struct
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Self
+
+_LOG = logging.getLogger(__name__)
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+CONNACK_BAD_PROTOCOL = 1
+SUBACK_FAILURE = 0x80
+
+
+class ProtocolError(Exception):
+    """Malformed packet or protocol violation. The connection is closed."""
+
+
+def topic_matches(sub: str, topic: str) -> bool:
+    """Return True if the topic matches the subscription filter."""
+    if topic.startswith("$") and sub[:1] in ("+", "#"):
+        return False
+    levels = topic.split("/")
+    for idx, level in enumerate(sub.split("/")):
+        if level == "#":
+            return True
+        if idx >= len(levels) or (level not in ("+", levels[idx])):
+            return False
+    return len(sub.split("/")) == len(levels)
+
+
+def valid_filter(sub: str) -> bool:
+    """Return True if the subscription filter is valid."""
+    levels = sub.split("/")
+    for idx, level in enumerate(levels):
+        if level == "#" and idx < len(levels) - 1:
+            return False
+        if ("#" in level or "+" in level) and len(level) > 1:
+            return False
+    return bool(sub)
+
+
+def _packet(ptype: int, flags: int, body: bytes) -> bytes:
+    """Encode a packet with the fixed header & remaining length."""
+    header = bytearray([ptype << 4 | flags])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(header) + body
+
+
+def _str(value: str | bytes) -> bytes:
+    """Encode a length prefixed string or binary."""
+    data = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+class _Reader:
+    """Read the fields of a packet body."""
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.pos = 0
+
+    def uint16(self) -> int:
+        if self.pos + 2 > len(self.body):
+            raise ProtocolError("Packet too short")
+        (val,) = struct.unpack_from("!H", self.body, self.pos)
+        self.pos += 2
+        return val
+
+    def binary(self) -> bytes:
+        size = self.uint16()
+        if self.pos + size > len(self.body):
+            raise ProtocolError("Packet too short")
+        self.pos += size
+        return self.body[self.pos - size : self.pos]
+
+    def str(self) -> str:
+        try:
+            return self.binary().decode("utf-8")
+        except UnicodeDecodeError as err:
+            raise ProtocolError("Invalid UTF-8 string") from err
+
+    def byte(self) -> int:
+        if self.pos >= len(self.body):
+            raise ProtocolError("Packet too short")
+        self.pos += 1
+        return self.body[self.pos - 1]
+
+    def rest(self) -> bytes:
+        return self.body[self.pos :]
+
+
+@dataclass
+class _Session:
+    """A connected client."""
+
+    client_id: str
+    writer: asyncio.StreamWriter
+    subscriptions: dict[str, int] = field(default_factory=dict)
+    will: tuple[str, bytes, int, bool] | None = None
+    packet_ids: count = field(default_factory=count)
+
+    def send(self, ptype: int, flags: int, body: bytes) -> None:
+        """Queue a packet."""
+        if not self.writer.is_closing():
+            self.writer.write(_packet(ptype, flags, body))
+
+    def send_publish(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        """Queue a PUBLISH. QoS 1 messages are not retried."""
+        body = _str(topic)
+        if qos:
+            body += struct.pack("!H", next(self.packet_ids) % 0xFFFF + 1)
+        self.send(PUBLISH, qos << 1 | retain, body + payload)
+
+
+@dataclass
+class MQTTBroker:
+    """Minimal in-process MQTT 3.1.1 broker.
+
+    Supports retained messages, wildcard subscriptions, last will & QoS 0/1/2
+    from clients (delivered with QoS 0 or 1). Sessions are not persisted and
+    there is no authentication. Intended for offline tests and benchmarks.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 0
+    """Listening port, 0 picks a free port on start."""
+
+    retained: dict[str, tuple[bytes, int]] = field(default_factory=dict)
+    """Retained payload & QoS by topic."""
+    messages_in: int = field(default=0, init=False)
+    """Number of PUBLISH packets received."""
+    messages_out: int = field(default=0, init=False)
+    """Number of PUBLISH packets sent."""
+
+    _sessions: dict[str, _Session] = field(default_factory=dict, init=False)
+    _server: asyncio.Server | None = field(default=None, init=False, repr=False)
+    _client_ids: count = field(default_factory=count, init=False, repr=False)
+
+    async def __aenter__(self) -> Self:
+        """Start the broker."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        """Stop the broker."""
+        await self.close()
+
+    @property
+    def clients(self) -> list[str]:
+        """Client IDs of the connected clients."""
+        return list(self._sessions)
+
+    async def start(self) -> None:
+        """Start listening."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        _LOG.debug("Broker: Listening on %s:%s", self.host, self.port)
+
+    async def close(self) -> None:
+        """Stop listening & close all connections, without last wills."""
+        if self._server is None:
+            return
+        self._server.close()
+        sessions = list(self._sessions.values())
+        for ses in sessions:
+            ses.will = None
+            ses.writer.close()
+        self._sessions.clear()
+        await self._server.wait_closed()
+        self._server = None
+
+    def drop(self, client_id: str) -> None:
+        """Close a client's connection without DISCONNECT, the will is published."""
+        self._sessions[client_id].writer.transport.abort()
+
+    def publish(
+        self, topic: str, payload: bytes, qos: int = 0, retain: bool = False
+    ) -> None:
+        """Store a retained message & route it to the subscribed clients."""
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        for ses in self._sessions.values():
+            granted = [
+                sqos
+                for sub, sqos in ses.subscriptions.items()
+                if topic_matches(sub, topic)
+            ]
+            if granted:
+                ses.send_publish(topic, payload, min(qos, max(granted)), False)
+                self.messages_out += 1
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve a connection."""
+        ses: _Session | None = None
+        try:
+            ptype, _, body = await self._read(reader, 10)
+            if ptype != CONNECT:
+                raise ProtocolError("Expected CONNECT")
+            ses, keepalive = self._connect(body, writer)
+            if ses is None:
+                return
+            while True:
+                ptype, flags, body = await self._read(reader, keepalive * 1.5)
+                if ptype == DISCONNECT:
+                    ses.will = None
+                    return
+                self._dispatch(ses, ptype, flags, body)
+                await self._drain()
+        except ProtocolError as err:
+            _LOG.warning("Broker: Closing connection, %s", err)
+        except (asyncio.IncompleteReadError, ConnectionError, TimeoutError):
+            pass
+        finally:
+            writer.close()
+            if ses and self._sessions.get(ses.client_id) is ses:
+                del self._sessions[ses.client_id]
+                if ses.will:
+                    self.publish(*ses.will)
+
+    @staticmethod
+    async def _read(
+        reader: asyncio.StreamReader, idle: float
+    ) -> tuple[int, int, bytes]:
+        """Read a packet within idle seconds. Return the type, flags & body."""
+        async with asyncio.timeout(idle or None):
+            first = (await reader.readexactly(1))[0]
+            length = 0
+            for shift in range(0, 28, 7):
+                byte = (await reader.readexactly(1))[0]
+                length |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+            else:
+                raise ProtocolError("Invalid remaining length")
+            return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+    def _connect(
+        self, body: bytes, writer: asyncio.StreamWriter
+    ) -> tuple[_Session | None, int]:
+        """Handle CONNECT. Return the session & keepalive."""
+        rdr = _Reader(body)
+        protocol, level = rdr.str(), rdr.byte()
+        if (protocol, level) not in (("MQTT", 4), ("MQIsdp", 3)):
+            writer.write(_packet(CONNACK, 0, bytes([0, CONNACK_BAD_PROTOCOL])))
+            return None, 0
+        flags, keepalive = rdr.byte(), rdr.uint16()
+        client_id = rdr.str() or f"auto-{next(self._client_ids)}"
+        ses = _Session(client_id=client_id, writer=writer)
+        if flags & 0x04:
+            topic, payload = rdr.str(), rdr.binary()
+            ses.will = (topic, payload, flags >> 3 & 0x03, bool(flags & 0x20))
+        if old := self._sessions.get(client_id):
+            old.writer.transport.abort()  # session takeover
+        self._sessions[client_id] = ses
+        ses.send(CONNACK, 0, bytes([0, 0]))
+        _LOG.debug("Broker: %s connected", client_id)
+        return ses, keepalive
+
+    def _dispatch(self, ses: _Session, ptype: int, flags: int, body: bytes) -> None:
+        """Handle a packet from a connected client."""
+        if ptype == PUBLISH:
+            self._on_publish(ses, flags, _Reader(body))
+        elif ptype == SUBSCRIBE:
+            self._on_subscribe(ses, _Reader(body))
+        elif ptype == UNSUBSCRIBE:
+            rdr = _Reader(body)
+            pid = rdr.uint16()
+            while rdr.pos < len(body):
+                ses.subscriptions.pop(rdr.str(), None)
+            ses.send(UNSUBACK, 0, struct.pack("!H", pid))
+        elif ptype == PUBREL:
+            ses.send(PUBCOMP, 0, body[:2])
+        elif ptype == PINGREQ:
+            ses.send(PINGRESP, 0, b"")
+        elif ptype not in (PUBACK, PUBREC, PUBCOMP):
+            raise ProtocolError(f"Unexpected packet type {ptype}")
+
+    def _on_publish(self, ses: _Session, flags: int, rdr: _Reader) -> None:
+        """Acknowledge & route a PUBLISH. QoS 2 is acknowledged with PUBREC."""
+        qos, retain = flags >> 1 & 0x03, bool(flags & 0x01)
+        topic = rdr.str()
+        if not topic or "+" in topic or "#" in topic or qos > 2:
+            raise ProtocolError(f"Invalid PUBLISH to '{topic}'")
+        if qos:
+            pid = rdr.uint16()
+            ses.send(PUBACK if qos == 1 else PUBREC, 0, struct.pack("!H", pid))
+        self.messages_in += 1
+        self.publish(topic, rdr.rest(), qos, retain)
+
+    def _on_subscribe(self, ses: _Session, rdr: _Reader) -> None:
+        """Add subscriptions, granted with QoS 0 or 1, & send the retained messages."""
+        pid = rdr.uint16()
+        granted = bytearray()
+        new = list[str]()
+        while rdr.pos < len(rdr.body):
+            sub, qos = rdr.str(), rdr.byte()
+            if not valid_filter(sub):
+                granted.append(SUBACK_FAILURE)
+                continue
+            ses.subscriptions[sub] = min(qos, 1)
+            granted.append(min(qos, 1))
+            new.append(sub)
+        ses.send(SUBACK, 0, struct.pack("!H", pid) + granted)
+        for topic, (payload, qos) in self.retained.items():
+            sqos = [ses.subscriptions[s] for s in new if topic_matches(s, topic)]
+            if sqos:
+                ses.send_publish(topic, payload, min(qos, max(sqos)), True)
+                self.messages_out += 1
+
+    async def _drain(self) -> None:
+        """Wait for clients with a large write buffer."""
+        for ses in list(self._sessions.values()):
+            if ses.writer.transport.get_write_buffer_size() > 1 << 16:
+                try:
+                    await ses.writer.drain()
+                except ConnectionError:
+                    pass
@@ -6,28 +6,68 @@ import asyncio
 import importlib.metadata
 import inspect
 import logging
+import secrets
+import threading
 import time
-from collections.abc import Callable, Coroutine, Generator
+from collections import deque
+from collections.abc import Callable, Coroutine, Generator, Iterable, Sequence
 from dataclasses import dataclass, field
+from functools import partial
+from hashlib import sha256
 from json import dumps
-from typing import Any, cast
+from typing import Any, Literal, cast
 
-from paho.mqtt.client import Client, MQTTMessage
+from paho.mqtt.client import (
+    MQTT_ERR_NO_CONN,
+    MQTT_ERR_SUCCESS,
+    Client,
+    MQTTMessage,
+    MQTTMessageInfo,
+    error_string,
+)
 from paho.mqtt.enums import CallbackAPIVersion
 from paho.mqtt.matcher import MQTTMatcher
 from paho.mqtt.reasoncodes import ReasonCode
 
 from .device import MQTTDevice, MQTTOrigin
+from .dispatch import TopicDispatcher
+from .entities import MQTTEntity, MQTTSensorEntity
+from .helpers import MQTT_EXPLORER_LIMIT
+from .metrics import (
+    COUNTERS,
+    LoopLagProbe,
+    Metrics,
+    prometheus_text,
+    serve_prometheus,
+)
 from .utils import load_json
 
 HA_STATUS_TOPIC = "homeassistant/status"
+METRIC_SENSORS = (
+    *COUNTERS,
+    "waiting",
+    "pending_tasks",
+    "dispatch_pending",
+    "pending_delivery",
+    "buffered",
+)
+"""Metrics published by MQTTClient.add_metrics_device."""
+SCAN_TOPIC = "mqtt-entity/scan"
 _LOG = logging.getLogger(__name__)
-MQTT_EXPLORER_LIMIT = 20000
 
 type SyncCallback = Callable[[str, str], None]
 type AsyncCallback = Callable[[str, str], Coroutine[Any, Any, None]]
 
-type TopicCallback = SyncCallback | AsyncCallback
+type BytesCallback = Callable[[bytes, str], None | Coroutine[Any, Any, None]]
+type MemoryviewCallback = Callable[[memoryview, str], None | Coroutine[Any, Any, None]]
+
+type TopicCallback = SyncCallback | AsyncCallback | BytesCallback | MemoryviewCallback
+
+type PayloadType = Literal["str", "bytes", "memoryview"]
+type Payload = str | bytes | memoryview
+type PublishPayload = str | bytes | None
+
+type _Dispatch = list[tuple[TopicHandler, tuple[Any, ...]]]
 
 
 @dataclass()
@@ -38,19 +78,71 @@ class MQTTAsyncClient:
     client: Client = field(init=False, repr=False)
     suppress_exceptions: bool = True
     connect_time: float = field(init=False, repr=False)
+    track_delivery: bool = False
+    """Publish returns a future, resolved when the broker acknowledged the message."""
+    native_loop: bool = False
+    """Drive paho's network I/O from the event loop, instead of paho's own thread."""
+    dispatcher: TopicDispatcher | None = None
+    """Run async callbacks in order per topic, with bounded concurrency & queues.
+    If None, every message's async callbacks run in their own task."""
+    max_packet_size: int = field(default=0, init=False, repr=False)
+    """Maximum packet size accepted by the broker (MQTT 5 CONNACK). 0 if unknown."""
+    write_behind: float = 0
+    """Interval (seconds) to flush buffered publishes. Only the latest message per
+    topic is published. 0 publishes buffered messages immediately."""
+    slow_callback: float = 0.5
+    """Warn when a sync callback blocks MQTT I/O for longer (seconds). 0 disables."""
+    slow_async_callback: float = 10
+    """Warn when an async callback, awaits included, runs for longer (seconds)."""
+    loop_lag_interval: float = 0
+    """Interval (seconds) of the event loop lag probe, which also reports callbacks
+    that are still running after their slow threshold. 0 disables the probe."""
+    loop_lag_threshold: float = 0.1
+    """Warn when the event loop is blocked for longer (seconds)."""
 
     _on_message_filtered: MQTTMatcher2 = field(
         default_factory=lambda: MQTTMatcher2(),  # noqa: PLW0108
         repr=False,
     )
     _loop: asyncio.AbstractEventLoop = field(init=False, repr=False)
+    _connected: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _pending_delivery: dict[int, asyncio.Future[None]] = field(
+        default_factory=dict, repr=False
+    )
+    _inbound: deque[tuple[str, _Dispatch]] = field(default_factory=deque, repr=False)
+    """Async callbacks queued by paho's thread, drained on the event loop."""
+    _inbound_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _inbound_scheduled: bool = field(default=False, repr=False)
+    _tasks: set[asyncio.Task] = field(default_factory=set, repr=False)
+    _network_task: asyncio.Task | None = field(default=None, repr=False)
+    _reading_paused: bool = field(default=False, repr=False)
+    _buffer: dict[str, tuple[str, PublishPayload, int, bool]] = field(
+        default_factory=dict, repr=False
+    )
+    """Write-behind buffer, the latest message per topic."""
+    _flush_task: asyncio.Task | None = field(default=None, repr=False)
+    _metrics: Metrics = field(default_factory=Metrics, repr=False)
+    _connect_start: float = field(default=0, repr=False)
+    """Monotonic time of connect() or the lost connection, 0 when connected."""
+    _reconnect_delay: float = field(default=1.0, repr=False)
+    """Next reconnect delay of the native loop, reset when connected."""
+    _probe: LoopLagProbe | None = field(default=None, repr=False)
+    _running: dict[int, tuple[str, str, float, float]] = field(
+        default_factory=dict, repr=False
+    )
+    """Callbacks in progress while the probe runs: name, topic, start & threshold."""
+    _stuck: set[int] = field(default_factory=set, repr=False)
+    _scans: tuple[_RetainedScan, ...] = field(default=(), repr=False)
+    """scan_retained calls in progress, replaced as a whole for paho's thread."""
 
     def __post_init__(self) -> None:
         """Init."""
         self.connect_time = 0
         self.client = Client(callback_api_version=CallbackAPIVersion.VERSION2)
         self.client.on_connect = self._mqtt_on_connect
+        self.client.on_disconnect = self._mqtt_on_disconnect
         self.client.on_message = self._mqtt_on_message
+        self.client.on_publish = self._mqtt_on_publish
 
     async def connect(
         self,
@@ -66,7 +158,19 @@ class MQTTAsyncClient:
         if self.client.is_connected():
             _LOG.warning("MQTT: Client connected. Reconnecting...")
         await self.disconnect()  # "Connection Successful" triggered on re-connect
-        self._loop = asyncio.get_running_loop()
+        loop = asyncio.get_running_loop()
+        if getattr(self, "_loop", None) is not loop:
+            # an Event is bound to the first loop that waits on it
+            connected = self._connected.is_set()
+            self._connected = asyncio.Event()
+            if connected:
+                self._connected.set()
+        self._loop = loop
+        with self._inbound_lock:
+            # a drain scheduled on a previous loop may never run
+            self._inbound_scheduled = bool(self._inbound)
+        if self._inbound_scheduled:
+            self._loop.call_soon(self._drain_inbound)
 
         if options:
             username = getattr(options, "mqtt_username", username)
@@ -74,18 +178,96 @@ class MQTTAsyncClient:
             host = getattr(options, "mqtt_host", host)
             port = getattr(options, "mqtt_port", port)
         self.client.username_pw_set(username=username, password=password)
+        self._connect_start = time.monotonic()
 
         if self.availability_topic:
             self.client.will_set(self.availability_topic, "offline", retain=True)
 
         _LOG.info("MQTT: Connecting to %s@%s:%s", username, host, port)
         self.client.connect_async(host=host, port=port)
-        self.client.loop_start()
+        if self.native_loop:
+            self.client.on_socket_open = self._on_socket_open
+            self.client.on_socket_close = self._on_socket_close
+            self.client.on_socket_register_write = self._on_socket_register_write
+            self.client.on_socket_unregister_write = self._on_socket_unregister_write
+            self._network_task = self._loop.create_task(self._network_loop())
+            if self.dispatcher:
+                self.dispatcher.on_space = self._resume_reading
+        else:
+            self.client.loop_start()
         self.connect_time = time.time() + 5
+        if self._buffer:
+            self._start_flush()
+        if self.loop_lag_interval > 0:
+            self._probe = LoopLagProbe(
+                self._loop,
+                self._metrics.loop_lag,
+                interval=self.loop_lag_interval,
+                threshold=self.loop_lag_threshold,
+                check=self._check_running,
+            )
+            self._probe.start()
 
         if wait_connected:
             await self.wait_connected()
 
+    async def _network_loop(self) -> None:
+        """Connect, reconnect & run paho's periodic tasks on the event loop.
+
+        Reads & writes are driven by the socket reader/writer callbacks.
+        Reconnects back off exponentially, until a connection is accepted.
+        """
+        self._reconnect_delay = 1.0
+        attempted = False
+        while True:
+            if not attempted or self.client.socket() is None:
+                if attempted:
+                    delay = self._reconnect_delay
+                    self._reconnect_delay = min(delay * 2, 120)
+                    _LOG.warning("MQTT: Disconnected. Reconnect in %ss", delay)
+                    await asyncio.sleep(delay)
+                attempted = True
+                try:
+                    await asyncio.to_thread(self.client.reconnect)
+                except OSError as err:
+                    _LOG.warning("MQTT: Connection failed: %s", err)
+                    continue
+            self.client.loop_misc()
+            await asyncio.sleep(1)
+
+    def _on_socket_open(self, client: Client, data: Any, sock: Any) -> None:
+        """Paho opened a socket, read from the event loop."""
+        self._on_loop(self._loop.add_reader, sock, self._loop_read)
+
+    def _loop_read(self) -> None:
+        """Socket reader callback."""
+        self.client.loop_read()
+
+    def _on_socket_close(self, client: Client, data: Any, sock: Any) -> None:
+        """Paho closed a socket."""
+        self._on_loop(self._loop.remove_reader, sock)
+
+    def _pause_reading(self) -> None:
+        """Stop reading from the broker (native_loop), until _resume_reading."""
+        if not self._reading_paused and (sock := self.client.socket()):
+            _LOG.debug("MQTT: Dispatch queue full, pause reading")
+            self._loop.remove_reader(sock)
+            self._reading_paused = True
+
+    def _resume_reading(self) -> None:
+        """Resume reading from the broker (native_loop)."""
+        if self._reading_paused and (sock := self.client.socket()):
+            self._loop.add_reader(sock, self._loop_read)
+        self._reading_paused = False
+
+    def _on_socket_register_write(self, client: Client, data: Any, sock: Any) -> None:
+        """Paho has data to write, write from the event loop."""
+        self._on_loop(self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client: Client, data: Any, sock: Any) -> None:
+        """Paho has no data to write."""
+        self._on_loop(self._loop.remove_writer, sock)
+
     def _mqtt_on_connect(
         self,
         client: Client,
@@ -98,8 +280,21 @@ class MQTTAsyncClient:
         if rc != 0:
             _LOG.error("MQTT: Connection failed with reason code %s", rc)
             self.connect_time = -1  # failed
+            self._threadsafe(self._wake_waiters)
             return
         _LOG.info("MQTT: Connected")
+        self._reconnect_delay = 1.0
+        met = self._metrics
+        if self._connect_start:
+            met.connect_time.observe(time.monotonic() - self._connect_start)
+            self._connect_start = 0
+        if met.connects:
+            met.reconnects += 1
+        met.connects += 1
+        self.max_packet_size = getattr(prop, "MaximumPacketSize", 0)
+        self._threadsafe(self._connected.set)
+        if self._buffer:
+            self._threadsafe(self._resume_flush)
         # publish online (Last will sets offline on disconnect)
         if self.availability_topic:
             client.publish(self.availability_topic, "online", retain=True)
@@ -109,10 +304,70 @@ class MQTTAsyncClient:
         # topic_subscribe()/topic_unsubscribe() concurrently.
         for topic in list(self._on_message_filtered.keys()):
             client.subscribe(topic)
+        for scan in self._scans:
+            for topic in scan.topics:
+                client.subscribe(topic)
+
+    def _mqtt_on_disconnect(
+        self,
+        client: Client,
+        data: Any,
+        flags: Any,
+        rc: ReasonCode,
+        prop: Any = None,
+    ) -> None:
+        """MQTT on_disconnect callback."""
+        self._connect_start = self._connect_start or time.monotonic()
+        self._threadsafe(self._connected.clear)
+
+    def _wake_waiters(self) -> None:
+        """Wake all wait_connected() calls, without changing the connection state."""
+        is_set = self._connected.is_set()
+        self._connected.set()
+        if not is_set:
+            self._connected.clear()
+
+    def _threadsafe(self, callback: Callable[..., Any], *args: Any) -> bool:
+        """Schedule a callback on the event loop. Safe to call from paho's thread.
+
+        Return False if the loop is closed & the callback was dropped.
+        """
+        loop: asyncio.AbstractEventLoop | None = getattr(self, "_loop", None)
+        if loop is None:
+            callback(*args)
+            return True
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.call_soon(callback, *args)  # native_loop, no wakeup required
+            return True
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:  # closed
+            return False
+        return True
+
+    def _on_loop(self, callback: Callable[..., Any], *args: Any) -> None:
+        """Register socket callbacks, immediately when on the event loop.
+
+        paho closes the socket once on_socket_close returns, so a deferred
+        removal would run on a closed socket. Calls from reconnect() in a
+        thread are scheduled on the loop.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback(*args)
+        else:
+            self._threadsafe(callback, *args)
 
     async def wait_connected(self) -> None:
         """Wait until connected."""
-        if self.client.is_connected():
+        if self._connected.is_set() or self.client.is_connected():
             return
         if self.connect_time == 0:
             raise RuntimeError("MQTT: Call connect first")
@@ -123,29 +378,57 @@ class MQTTAsyncClient:
             _LOG.warning("MQTT: Connection lost. Waiting for reconnect...")
             self.connect_time = time.time() + 30
         _LOG.debug("MQTT: Waiting for connection...")
-        while True:
-            if self.client.is_connected():
-                return
-            await asyncio.sleep(0.1)
-            if time.time() > self.connect_time:
+        self._metrics.waiting += 1
+        try:
+            while True:
                 if self.connect_time < 0:
                     raise ConnectionError("MQTT: Connection failed")
-                msg = "MQTT: Connection timeout (30s)"
-                _LOG.error(msg)
-                raise ConnectionError(msg)
+                timeout = self.connect_time - time.time()
+                if timeout <= 0:
+                    msg = "MQTT: Connection timeout (30s)"
+                    _LOG.error(msg)
+                    raise ConnectionError(msg)
+                try:
+                    async with asyncio.timeout(timeout):
+                        await self._connected.wait()
+                except TimeoutError:
+                    pass
+                if self._connected.is_set():
+                    return
+        finally:
+            self._metrics.waiting -= 1
 
     async def disconnect(self) -> None:
-        """Stop the MQTT client."""
+        """Stop the MQTT client.
 
-        def _stop() -> None:
-            """Do not disconnect, allow the broker to publish LWT message."""
-            self.client.loop_stop()
+        Do not disconnect, allow the broker to publish LWT message.
+        """
+        if self.dispatcher:
+            self.dispatcher.close()  # release paho's thread if blocked
+        if self._probe:
+            self._probe.stop()
+            self._probe = None
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+            if self._connected.is_set():
+                await self.flush()
+        if self._network_task:
+            self._network_task.cancel()
+            self._network_task = None
+            if sock := self.client.socket():
+                self._loop.remove_reader(sock)
+                self._loop.remove_writer(sock)
+        else:
+            await asyncio.to_thread(self.client.loop_stop)
 
-        await asyncio.to_thread(_stop)
+        for fut in self._pending_delivery.values():
+            fut.cancel()
+        self._pending_delivery.clear()
 
     def publish_args(
-        self, topic: str, payload: str | None, qos: int, retain: bool
-    ) -> tuple[str, str | None, int, bool]:
+        self, topic: str, payload: PublishPayload, qos: int, retain: bool
+    ) -> tuple[str, PublishPayload, int, bool]:
         """Prep publish parameters."""
         if not topic:
             raise ValueError(f"MQTT: Cannot publish to empty topic (payload={payload})")
@@ -153,9 +436,14 @@ class MQTTAsyncClient:
             qos = 0
         if retain:
             qos = 1
-        _LOG.debug(
-            "MQTT: Publish %s%s %s, %s", qos, "R" if retain else "", topic, payload
-        )
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug(
+                "MQTT: Publish %s%s %s, %s",
+                qos,
+                "R" if retain else "",
+                topic,
+                f"<{len(payload)} bytes>" if isinstance(payload, bytes) else payload,
+            )
         if payload and len(payload) > MQTT_EXPLORER_LIMIT:
             _LOG.info(
                 "MQTT: Payload >%s: %s (MQTTExplorer will truncate the message)",
@@ -167,91 +455,484 @@ class MQTTAsyncClient:
     async def publish(
         self,
         topic: str,
-        payload: str | None = None,
+        payload: PublishPayload = None,
         qos: int = 0,
         retain: bool = False,
-    ) -> None:
-        """Publish a MQTT message."""
+        *,
+        buffered: bool = False,
+    ) -> asyncio.Future[None] | None:
+        """Publish a MQTT message. A bytes payload is passed to paho as is.
+
+        With track_delivery, return a future that resolves once the broker
+        acknowledged the message (PUBACK/PUBCOMP, or once sent for QoS 0).
+
+        With buffered & write_behind, the message replaces any buffered message
+        for the topic & returns immediately. It is published by the next flush.
+        """
+        if buffered and self.write_behind > 0:
+            if not topic:
+                raise ValueError(f"MQTT: Cannot publish to empty topic ({payload=})")
+            self._buffer[topic] = (topic, payload, qos, retain)
+            if self._flush_task is None and not self._refused():
+                self._start_flush()
+            return None
         args = self.publish_args(topic, payload, qos, retain)
         await self.wait_connected()
-        await asyncio.to_thread(self.client.publish, *args)
+        if self.track_delivery:
+            return self._publish_tracked(args)
+        if self.native_loop:
+            self._paho_publish(args)
+        else:
+            await asyncio.to_thread(self._paho_publish, args)
+        return None
+
+    async def publish_many(
+        self, messages: Iterable[tuple[str, PublishPayload, int, bool]]
+    ) -> list[asyncio.Future[None]]:
+        """Publish a batch of MQTT messages.
+
+        Messages are (topic, payload, qos, retain) tuples. The batch is handed to
+        paho in a single thread hop, after a single connection check.
+        With track_delivery, return a delivery future per message.
+        """
+        args = [self.publish_args(*msg) for msg in messages]
+        if not args:
+            return []
+        await self.wait_connected()
+        if self.track_delivery:
+            return [self._publish_tracked(arg) for arg in args]
+
+        def _publish() -> None:
+            for arg in args:
+                self._paho_publish(arg)
+
+        if self.native_loop:
+            _publish()
+        else:
+            await asyncio.to_thread(_publish)
+        return []
+
+    def _start_flush(self) -> None:
+        """Start the write-behind flush task."""
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def _refused(self) -> bool:
+        """Return True if the broker refused the connection & not connected since."""
+        return self.connect_time < 0 and not self._connected.is_set()
+
+    def _resume_flush(self) -> None:
+        """Restart the flush task, stopped by a refused connection."""
+        if self._buffer and self._flush_task is None:
+            self._start_flush()
+
+    async def _flush_loop(self) -> None:
+        """Flush the write-behind buffer every write_behind seconds, until empty.
+
+        Stops if the connection is refused, restarted by the next connection.
+        """
+        try:
+            while self._buffer:
+                await asyncio.sleep(self.write_behind)
+                if self._refused():
+                    _LOG.warning(
+                        "MQTT: Connection failed, %s messages buffered until connected",
+                        len(self._buffer),
+                    )
+                    break
+                if self.connect_time:  # connect() was called
+                    await self.flush()
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    async def flush(self) -> None:
+        """Publish all buffered messages, as a single batch."""
+        if not self._buffer:
+            return
+        try:
+            await self.wait_connected()
+        except ConnectionError as err:
+            _LOG.warning(
+                "MQTT: Flush failed, retry %s messages: %s", len(self._buffer), err
+            )
+            return
+        batch, self._buffer = self._buffer, {}
+        try:
+            await self.publish_many(batch.values())
+        except BaseException as err:
+            for topic, msg in batch.items():
+                self._buffer.setdefault(topic, msg)  # keep newer messages
+            if not isinstance(err, ConnectionError):
+                raise  # cancelled
+            _LOG.warning("MQTT: Flush failed, retry %s messages: %s", len(batch), err)
+
+    def _paho_publish(
+        self, args: tuple[str, PublishPayload, int, bool]
+    ) -> MQTTMessageInfo:
+        """Hand a message to paho & count it, if sent or queued."""
+        info = self.client.publish(*args)
+        if info.rc == MQTT_ERR_SUCCESS or (info.rc == MQTT_ERR_NO_CONN and args[2]):
+            # QoS>0 messages are queued by paho & sent on reconnect
+            met = self._metrics
+            met.messages_out += 1
+            if payload := args[1]:
+                size = len(payload)
+                if isinstance(payload, str) and not payload.isascii():
+                    size = len(payload.encode())
+                met.bytes_out += size
+        return info
+
+    def _publish_tracked(
+        self, args: tuple[str, PublishPayload, int, bool]
+    ) -> asyncio.Future[None]:
+        """Publish & return a future that resolves on delivery.
+
+        paho's publish does not block, so it is called on the event loop. This
+        ensures the future is registered before _mqtt_on_publish can resolve it.
+        Failures are logged, also when the caller discards the future.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(partial(_delivery_done, args[0]))
+        info = self._paho_publish(args)
+        if info.rc == MQTT_ERR_SUCCESS or (info.rc == MQTT_ERR_NO_CONN and args[2]):
+            self._pending_delivery[info.mid] = fut
+        else:
+            fut.set_exception(
+                ConnectionError(f"MQTT: Publish failed: {error_string(info.rc)}")
+            )
+        return fut
+
+    def _mqtt_on_publish(
+        self,
+        client: Client,
+        data: Any,
+        mid: int,
+        rc: ReasonCode,
+        prop: Any = None,
+    ) -> None:
+        """MQTT on_publish callback."""
+        if self.track_delivery:
+            self._threadsafe(self._delivered, mid, rc)
+
+    def _delivered(self, mid: int, rc: ReasonCode) -> None:
+        """Resolve the delivery future of a message."""
+        fut = self._pending_delivery.pop(mid, None)
+        if fut is None or fut.done():
+            return
+        if rc.is_failure:
+            fut.set_exception(ConnectionError(f"MQTT: Publish failed: {rc}"))
+        else:
+            fut.set_result(None)
 
     def topic_unsubscribe(self, topic: str) -> None:
         """Remove a topic from the topic callbacks."""
         self.client.unsubscribe(topic)
         self._on_message_filtered.pop(topic)
 
-    def topic_subscribe(self, topic: str, callback: TopicCallback) -> None:
-        """Add a topic to the topic callbacks."""
+    def topic_subscribe(
+        self,
+        topic: str,
+        callback: TopicCallback,
+        *,
+        payload_type: PayloadType = "str",
+    ) -> None:
+        """Add a topic to the topic callbacks.
+
+        The callback receives the payload as a UTF-8 decoded str, or as the raw
+        bytes/memoryview for binary payloads (no decoding or copies).
+        """
         _LOG.debug("MQTT: Add callback for topic %s", topic)
-        self._on_message_filtered[topic] = callback
+        self._on_message_filtered[topic] = TopicHandler.create(callback, payload_type)
         self.client.subscribe(topic)
 
+    async def scan_retained(
+        self, *topic_filters: str, max_time: float = 10
+    ) -> dict[str, bytes]:
+        """Return the retained messages on the topic filters, by topic.
+
+        After subscribing, a sentinel message is published to a private topic.
+        The broker delivers the retained messages of a subscription before any
+        later message, so the scan completes when the sentinel is received.
+        Empty payloads are skipped. Return what was received after max_time.
+        Topic callbacks on the filters are kept & receive the messages again.
+        """
+        scan = _RetainedScan.create(topic_filters)
+        done = asyncio.Event()
+        sentinel = f"{SCAN_TOPIC}/{secrets.token_hex(8)}"
+
+        def _done(payload: bytes, topic: str) -> None:
+            self._threadsafe(done.set)
+
+        await self.wait_connected()
+        # Collected on paho's thread, in order before the sentinel
+        self._scans = (*self._scans, scan)
+        for topic in topic_filters:
+            self.client.subscribe(topic)
+        self.topic_subscribe(sentinel, _done, payload_type="bytes")
+        try:
+            await self.publish(sentinel, b"scan")
+            async with asyncio.timeout(max_time):
+                await done.wait()
+        except TimeoutError:
+            _LOG.warning(
+                "MQTT: Retained scan of %s incomplete after %ss",
+                topic_filters,
+                max_time,
+            )
+        finally:
+            self._scans = tuple(s for s in self._scans if s is not scan)
+            self.topic_unsubscribe(sentinel)
+            keep = set(self._on_message_filtered.keys())
+            keep.update(*(s.topics for s in self._scans))
+            for topic in scan.topics - keep:
+                self.client.unsubscribe(topic)
+        return scan.retained
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return a snapshot of the counters, gauges & histograms.
+
+        Callback times are wall clock, async callbacks include their awaits.
+        """
+        return self._metrics.snapshot(
+            pending_tasks=len(self._tasks),
+            dispatch_pending=self.dispatcher.pending if self.dispatcher else 0,
+            pending_delivery=len(self._pending_delivery),
+            buffered=len(self._buffer),
+        )
+
+    async def start_metrics_server(
+        self, port: int = 9100, host: str = "127.0.0.1"
+    ) -> asyncio.Server:
+        """Serve the metrics in the Prometheus text format on /metrics."""
+        return await serve_prometheus(
+            lambda: prometheus_text(self.metrics), host=host, port=port
+        )
+
     def _mqtt_on_message(self, c: Client, userdata: Any, message: MQTTMessage) -> None:
         """MQTT on_message fallback."""
         topic = message.topic
-        payload = message.payload.decode("utf-8")
+        raw = message.payload
         if not topic:
-            _LOG.warning("MQTT: received empty topic, payload: %s", payload)
+            _LOG.warning("MQTT: received empty topic, payload: %s", raw)
             return
+        met = self._metrics
+        met.messages_in += 1
+        met.bytes_in += len(raw)
+        scanned = False
+        for scan in self._scans:
+            scanned = scan.collect(topic, raw) or scanned
 
-        # split sync & async callbacks
-        sync_cbs = list[tuple[SyncCallback, tuple[str, ...]]]()
-        async_cbs = list[tuple[AsyncCallback, tuple[str, ...]]]()
-        for cb in self._on_message_filtered.iter_match(topic):
-            cnt = len(inspect.signature(cb).parameters)
-            args: tuple[str, ...] = (payload,) if cnt == 1 else (payload, message.topic)
-            if inspect.iscoroutinefunction(cb):
-                async_cbs.append((cb, args))
-                continue
+        # split sync & async callbacks, decode only for str callbacks
+        sync_cbs: _Dispatch = []
+        async_cbs: _Dispatch = []
+        text: str | None = None
+        for hdl in self._on_message_filtered.match(topic):
+            payload: Payload
+            if hdl.payload_type == "str":
+                if text is None:
+                    text = raw.decode("utf-8")
+                payload = text
+            elif hdl.payload_type == "bytes":
+                payload = raw
             else:
-                sync_cbs.append((cast(SyncCallback, cb), args))
+                payload = memoryview(raw)
+            args = (payload,) if hdl.arity == 1 else (payload, topic)
+            (async_cbs if hdl.is_async else sync_cbs).append((hdl, args))
 
         if not sync_cbs and not async_cbs:
+            if scanned:
+                return None
             _LOG.warning(
-                "MQTT: Unhandled msg received. Topic %s with payload %s", topic, payload
+                "MQTT: Unhandled msg received. Topic %s with payload %s", topic, raw
             )
             return None
 
-        _LOG.debug(
-            "MQTT: topic %s, async callbacks: %s, sync callbacks: %s",
-            topic,
-            [c[0].__name__ for c in async_cbs],
-            [c[0].__name__ for c in sync_cbs],
-        )
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug(
+                "MQTT: topic %s, async callbacks: %s, sync callbacks: %s",
+                topic,
+                [c[0].name for c in async_cbs],
+                [c[0].name for c in sync_cbs],
+            )
+
+        if sync_cbs:
+            self._run_sync_cbs(topic, sync_cbs)
+        if async_cbs:
+            self._queue_inbound(topic, async_cbs)
 
-        for cb, args in sync_cbs:
-            name = cb.__name__
+    def _run_sync_cbs(self, topic: str, sync_cbs: _Dispatch) -> None:
+        """Run sync callbacks for a message, on paho's thread."""
+        for hdl, args in sync_cbs:
+            start = time.perf_counter()
+            if self._probe:
+                self._running[id(args)] = (hdl.name, topic, start, self.slow_callback)
             try:
-                _LOG.debug("MQTT: Callback %s(%s, topic=%s)", name, payload, topic)
-                cb(*args)
+                _LOG.debug("MQTT: Callback %s(%s, topic=%s)", hdl.name, args[0], topic)
+                hdl.callback(*args)
             except Exception as err:
                 _LOG.error(
-                    "MQTT: Exception in callback %s(topic=%s): %s", name, topic, err
+                    "MQTT: Exception in callback %s(topic=%s): %s", hdl.name, topic, err
                 )
                 if not self.suppress_exceptions:
                     raise
+            finally:
+                self._callback_done(hdl.name, topic, args, start, self.slow_callback)
 
-        if not async_cbs:
+    def _queue_inbound(self, topic: str, async_cbs: _Dispatch) -> None:
+        """Queue async callbacks from paho's thread.
+
+        The event loop is only woken when the queue was empty; a single drain
+        dispatches everything queued up to that point.
+        """
+        if self.dispatcher and not self.native_loop:
+            self.dispatcher.wait_space(topic)
+        with self._inbound_lock:
+            self._inbound.append((topic, async_cbs))
+            if self._inbound_scheduled:
+                return
+            self._inbound_scheduled = True
+        if not self._threadsafe(self._drain_inbound):
+            with self._inbound_lock:
+                self._inbound_scheduled = False  # drained by the next connect
+
+    def _drain_inbound(self) -> None:
+        """Dispatch all queued async callbacks, on the event loop."""
+        with self._inbound_lock:
+            batch, self._inbound = self._inbound, deque()
+            self._inbound_scheduled = False
+        if dispatcher := self.dispatcher:
+            for topic, async_cbs in batch:
+                dispatcher.submit(topic, partial(self._run_async_cbs, topic, async_cbs))
+            if self.native_loop and not dispatcher.space.is_set():
+                self._pause_reading()
             return
 
-        async def cbs() -> None:
-            """Run async callbacks."""
-            for cb, args in async_cbs:
-                name = cb.__name__
-                try:
-                    _LOG.debug(
-                        "MQTT: Callback async %s(%s, topic=%s)", name, payload, topic
-                    )
-                    await cb(*args)
-                except Exception as err:
-                    _LOG.error(
-                        "MQTT: Exception in callback %s(topic=%s): %s", name, topic, err
-                    )
-                    if not self.suppress_exceptions:
-                        raise
+        loop = asyncio.get_running_loop()
+        for topic, async_cbs in batch:
+            # Eager tasks run until the first suspension, callbacks that
+            # complete without awaiting I/O never go through the ready queue
+            task = asyncio.eager_task_factory(
+                loop, self._run_async_cbs(topic, async_cbs)
+            )
+            if not task.done():
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run_async_cbs(self, topic: str, async_cbs: _Dispatch) -> None:
+        """Run async callbacks for a message."""
+        limit = self.slow_async_callback
+        for hdl, args in async_cbs:
+            start = time.perf_counter()
+            if self._probe:
+                self._running[id(args)] = (hdl.name, topic, start, limit)
+            try:
+                _LOG.debug(
+                    "MQTT: Callback async %s(%s, topic=%s)", hdl.name, args[0], topic
+                )
+                await cast(AsyncCallback, hdl.callback)(*args)
+            except Exception as err:
+                _LOG.error(
+                    "MQTT: Exception in callback %s(topic=%s): %s", hdl.name, topic, err
+                )
+                if not self.suppress_exceptions:
+                    raise
+            finally:
+                self._callback_done(hdl.name, topic, args, start, limit)
+
+    def _callback_done(
+        self, name: str, topic: str, args: tuple[Any, ...], start: float, limit: float
+    ) -> None:
+        """Record the callback time, warn if it was slow."""
+        duration = time.perf_counter() - start
+        self._metrics.observe_callback(name, duration)
+        if self._running:
+            self._running.pop(id(args), None)
+            self._stuck.discard(id(args))
+        if limit and duration > limit:
+            slow = self._metrics.slow_callbacks
+            slow[name] = slow.get(name, 0) + 1
+            _LOG.warning(
+                "MQTT: Slow callback %s(topic=%s) took %.3fs, limit %ss",
+                name,
+                topic,
+                duration,
+                limit,
+            )
+
+    def _check_running(self) -> None:
+        """Warn about callbacks still running after their threshold, once each.
 
-        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(cbs()))
+        Called from the probe's thread.
+        """
+        now = time.perf_counter()
+        for key, (name, topic, start, limit) in list(self._running.items()):
+            if limit and now - start > limit and key not in self._stuck:
+                self._stuck.add(key)
+                _LOG.warning(
+                    "MQTT: Callback %s(topic=%s) still running after %.1fs",
+                    name,
+                    topic,
+                    now - start,
+                )
+
+
+def _delivery_done(topic: str, fut: asyncio.Future[None]) -> None:
+    """Retrieve the exception of a delivery future, awaited or not."""
+    if not fut.cancelled() and (err := fut.exception()):
+        _LOG.debug("MQTT: %s not delivered: %s", topic, err)
+
+
+@dataclass(slots=True, frozen=True)
+class _RetainedScan:
+    """The topic filters & the retained messages of a scan_retained call."""
+
+    topics: frozenset[str]
+    matcher: MQTTMatcher
+    retained: dict[str, bytes]
+
+    @classmethod
+    def create(cls, topic_filters: Iterable[str]) -> _RetainedScan:
+        """Create a scan."""
+        matcher = MQTTMatcher()
+        for topic in topic_filters:
+            matcher[topic] = True
+        return cls(frozenset(topic_filters), matcher, {})
+
+    def collect(self, topic: str, payload: bytes) -> bool:
+        """Keep the payload if the topic matches. Empty payloads are skipped."""
+        if not any(self.matcher.iter_match(topic)):
+            return False
+        if payload:
+            self.retained[topic] = payload
+        return True
+
+
+@dataclass(slots=True, frozen=True)
+class TopicHandler:
+    """A topic callback, analysed once when subscribing."""
+
+    callback: TopicCallback
+    name: str
+    arity: int
+    """Number of arguments. 1: callback(payload), otherwise callback(payload, topic)."""
+    is_async: bool
+    payload_type: PayloadType = "str"
+
+    @classmethod
+    def create(
+        cls, callback: TopicCallback, payload_type: PayloadType = "str"
+    ) -> TopicHandler:
+        """Create the dispatch record for a callback."""
+        if payload_type not in ("str", "bytes", "memoryview"):
+            raise ValueError(f"Invalid payload_type: {payload_type}")
+        return cls(
+            callback=callback,
+            name=getattr(callback, "__name__", repr(callback)),
+            arity=len(inspect.signature(callback).parameters),
+            is_async=inspect.iscoroutinefunction(callback),
+            payload_type=payload_type,
+        )
 
 
 @dataclass()
@@ -267,6 +948,74 @@ class MQTTClient(MQTTAsyncClient):
     origin_url: str = ""
     clean_entities: int = 1
     """Clean entities on discovery: 1=migrate, 2=remove, 0=none."""
+    retain_discovery: bool = False
+    """Publish discovery info with the retain flag. Devices with an unchanged
+    retained config on the broker are not published again."""
+    retained_scan_time: float = 10
+    """Maximum time to collect the retained discovery configs. The scan normally
+    completes as soon as the broker delivered all retained messages."""
+    discovery_max_bytes: int = 0
+    """Split the discovery info of a device with many components into payloads of
+    at most this size. Also limited by the broker's max_packet_size. 0=no limit.
+    With retain_discovery, the split continues from the retained payloads."""
+    discovery_window: int = 50
+    """Maximum discovery messages awaiting delivery, with track_delivery."""
+    discovery_in_executor: bool = False
+    """Build the discovery payloads in a thread, for large numbers of devices."""
+
+    _restored_parts: set[str] = field(default_factory=set, repr=False)
+    """Devices with the discovery split restored from the retained payloads."""
+    _metrics_sensors: dict[str, MQTTSensorEntity] = field(
+        default_factory=dict, repr=False
+    )
+    _metrics_interval: float = field(default=60, repr=False)
+    _metrics_task: asyncio.Task | None = field(default=None, repr=False)
+
+    def add_metrics_device(
+        self, identifier: str, *, name: str = "", interval: float = 60
+    ) -> MQTTDevice:
+        """Add a device with the client metrics as diagnostic sensors.
+
+        The states are published every interval seconds, after the discovery info.
+        """
+        self._metrics_interval = interval
+        self._metrics_sensors = {
+            key: MQTTSensorEntity(
+                name=key.replace("_", " ").capitalize(),
+                unique_id=f"{identifier}_{key}",
+                state_topic=f"{identifier}/metrics/{key}",
+                entity_category="diagnostic",
+                state_class="total_increasing" if key in COUNTERS else "measurement",
+            )
+            for key in METRIC_SENSORS
+        }
+        dev = MQTTDevice(
+            identifiers=[identifier],
+            name=name or f"{self.origin_name} metrics",
+            components={e.unique_id: e for e in self._metrics_sensors.values()},
+        )
+        self.devs.append(dev)
+        return dev
+
+    async def _publish_metrics(self) -> None:
+        """Publish the metrics sensor states periodically."""
+        while True:
+            snap = self.metrics
+            try:
+                await self.publish_many(
+                    (ent.state_topic, str(snap[key]), 0, False)
+                    for key, ent in self._metrics_sensors.items()
+                )
+            except ConnectionError as err:
+                _LOG.warning("MQTT: Metrics not published: %s", err)
+            await asyncio.sleep(self._metrics_interval)
+
+    async def disconnect(self) -> None:
+        """Stop publishing metrics & stop the MQTT client."""
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+        await super().disconnect()
 
     def monitor_homeassistant_status(self) -> None:
         """Monitor homeassistant/status & publish discovery info."""
@@ -315,84 +1064,214 @@ class MQTTClient(MQTTAsyncClient):
             _LOG.warning("MQTT: No devices to publish discovery info for")
             return
 
-        if self.clean_entities:
-            self._clean_entity_based_discovery()
-            await asyncio.sleep(1)
+        migrated = await self._clean_entity_based_discovery()
 
-        for ddev in self.devs:
-            disco_topic, disco_dict = ddev.discovery_info(
-                self.availability_topic,
-                origin=MQTTOrigin(
-                    name=self.origin_name,
-                    sw=self.origin_version,
-                    url=self.origin_url,
-                ),
+        origin = MQTTOrigin(
+            name=self.origin_name, sw=self.origin_version, url=self.origin_url
+        )
+        max_bytes = self.discovery_max_bytes
+        if self.max_packet_size:
+            # Leave space for the fixed header, topic & properties
+            limit = self.max_packet_size - 256
+            max_bytes = min(max_bytes, limit) if max_bytes else limit
+        if max_bytes and self.retain_discovery:
+            await self._restore_discovery_parts()
+
+        def _build() -> list[tuple[str, str]]:
+            return [
+                part
+                for ddev in self.devs
+                for part in ddev.discovery_payloads(
+                    self.availability_topic, origin=origin, max_bytes=max_bytes
+                )
+            ]
+
+        if self.discovery_in_executor:
+            payloads = await asyncio.get_running_loop().run_in_executor(None, _build)
+        else:
+            payloads = _build()
+
+        retained = {}
+        if self.retain_discovery:
+            retained = await self._retained_digests(t for t, _ in payloads)
+        messages = [
+            (topic, payload, 0, self.retain_discovery)
+            for topic, payload in payloads
+            if retained.get(topic) != sha256(payload.encode()).digest()
+        ]
+        if len(messages) < len(payloads):
+            _LOG.info(
+                "MQTT: Discovery info unchanged for %s topics",
+                len(payloads) - len(messages),
             )
-            disco_payload = dumps(disco_dict)
-            if len(disco_payload) > MQTT_EXPLORER_LIMIT:
-                disco_payload = dumps(disco_dict, indent=None, separators=(",", ":"))
-            await self.publish(disco_topic, disco_payload)
-
-            # add topic callbacks
-            tcb: dict[str, TopicCallback] = {}
-            tcb = dict[str, TopicCallback]()
+        await self._publish_window(messages, self.discovery_window)
+        if migrated:
+            # Home Assistant processes the messages in order: the migrate markers,
+            # the device discovery & then the removal of the old topics
+            await self.publish_many([(t, None, 1, True) for t in migrated])
+
+        self._subscribe_components()
+
+        if self._metrics_sensors and self._metrics_task is None:
+            self._metrics_task = asyncio.get_running_loop().create_task(
+                self._publish_metrics()
+            )
+
+    def _subscribe_components(self) -> None:
+        """Add the topic callbacks of the components."""
+        tcb = dict[str, TopicCallback]()
+        for ddev in self.devs:
             for ent in ddev.components.values():
                 tcb.update(ent.topic_callbacks)
-            for topic, cbk in tcb.items():
-                self.topic_subscribe(topic, cbk)
+                if isinstance(ent, MQTTEntity):
+                    ent.clear_state_cache()  # HA lost non-retained states
+        for topic, cbk in tcb.items():
+            self.topic_subscribe(topic, cbk)
 
-    def _clean_entity_based_discovery(self) -> None:
+    async def _restore_discovery_parts(self) -> None:
+        """Restore the discovery split of new devices from a previous run."""
+        devs = [d for d in self.devs if d.id not in self._restored_parts]
+        if not devs:
+            return
+        retained = await self.scan_retained(
+            "homeassistant/device/+/config", max_time=self.retained_scan_time
+        )
+        for ddev in devs:
+            ddev.restore_discovery_parts(retained)
+            self._restored_parts.add(ddev.id)
+
+    async def _publish_window(
+        self, messages: Sequence[tuple[str, PublishPayload, int, bool]], window: int
+    ) -> None:
+        """Publish messages, with at most window messages awaiting delivery.
+
+        Without track_delivery, all messages are handed to paho at once.
+        """
+        if not self.track_delivery:
+            await self.publish_many(messages)
+            return
+        pending = set[asyncio.Future[None]]()
+        failed = 0
+        for msg in messages:
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                failed += sum(1 for f in done if f.cancelled() or f.exception())
+            if fut := await self.publish(*msg):
+                pending.add(fut)
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            failed += sum(1 for f in done if f.cancelled() or f.exception())
+        if failed:
+            _LOG.warning("MQTT: %s of %s messages not delivered", failed, len(messages))
+
+    async def _retained_digests(self, topics: Iterable[str]) -> dict[str, bytes]:
+        """Return the SHA-256 digests of the retained messages on the topics."""
+        retained = await self.scan_retained(*topics, max_time=self.retained_scan_time)
+        return {topic: sha256(payload).digest() for topic, payload in retained.items()}
+
+    async def _clean_entity_based_discovery(self) -> list[str]:
         """Remove entity based discovery as part of discovery info.
 
         https://www.home-assistant.io/docs/mqtt/discovery/
         Publish discovery topics on "homeassistant/device/{device_id}/{sensor_id}/config"
         Publish discovery topics on "homeassistant/(sensor|switch)/{device_id}/{sensor_id}/config"
-        """
-
-        async def cb_migrate(payload_s: str, topic: str) -> None:
-            """Migrate to device based discovery."""
-            if not payload_s:
-                return
-            payload = load_json(payload_s)
-            _LOG.info("MQTT MIGRATE topic %s with payload %s", topic, payload)
-            migrate_ok = payload == {"migrate_discovery": True}
-            _pl = None if migrate_ok else dumps({"migrate_discovery": True})
-            if migrate_ok:
-                await asyncio.sleep(5)
-            await self.publish(topic=topic, payload=_pl, qos=1, retain=True)
-
-        def cb_remove(dev: MQTTDevice) -> TopicCallback:
-            """Create a callback for the device."""
-
-            async def _cb_remove(payload_s: str, topic: str) -> None:
-                if not payload_s:
-                    return
-                payload = load_json(payload_s)
-                # if not part of this device, remove the topic
-                if not isinstance(payload, dict) or "unique_id" not in payload:
-                    _LOG.warning(
-                        "MQTT CLEAN: No unique_id in payload %s, cannot remove", payload
-                    )
-                    return
-                uid = payload["unique_id"]
-                if uid not in dev.components:
-                    _LOG.info("MQTT: Removing unique ID %s", uid)
-                    self.client.publish(topic=topic, payload=None, qos=1, retain=True)
-
-            return _cb_remove
 
+        Return the migrated topics, to clear once the device discovery is published.
+        """
         if self.clean_entities == 0:
-            return
+            return []
         migrate = self.clean_entities == 1
         self.clean_entities = 0
-        for dev in self.devs:
-            topic = f"homeassistant/+/{dev.id}/+/config"
-            self.topic_subscribe(topic, cb_migrate if migrate else cb_remove(dev))
-            asyncio.get_running_loop().call_later(10, self.topic_unsubscribe, topic)
+        devs = {dev.id: dev for dev in self.devs}
+        retained = await self.scan_retained(
+            *(f"homeassistant/+/{dev_id}/+/config" for dev_id in devs),
+            max_time=self.retained_scan_time,
+        )
+
+        marker = {"migrate_discovery": True}
+        messages = list[tuple[str, PublishPayload, int, bool]]()
+        migrated = list[str]()
+        for topic, payload_b in retained.items():
+            payload = load_json(payload_b.decode())
+            if migrate:
+                _LOG.info("MQTT MIGRATE topic %s with payload %s", topic, payload)
+                if payload != marker:
+                    messages.append((topic, dumps(marker), 1, True))
+                migrated.append(topic)
+                continue
+            # if not part of this device, remove the topic
+            if not isinstance(payload, dict) or "unique_id" not in payload:
+                _LOG.warning(
+                    "MQTT CLEAN: No unique_id in payload %s, cannot remove", payload
+                )
+                continue
+            uid = payload["unique_id"]
+            if uid not in devs[topic.split("/")[2]].components:
+                _LOG.info("MQTT: Removing unique ID %s", uid)
+                messages.append((topic, None, 1, True))
+        await self.publish_many(messages)
+        return migrated
 
 
 class MQTTMatcher2(MQTTMatcher):
-    """Extend MQTTMatcher to return all keys."""
+    """Extend MQTTMatcher to return all keys.
+
+    Literal filters are indexed in a dict, so most topics match without walking
+    the trie. Wildcard filters are indexed by their first level & matches are
+    cached per topic, until a wildcard filter is added or removed.
+    """
+
+    cache_size = 4096
+    """Maximum number of topics in the wildcard match cache."""
+
+    def __init__(self) -> None:
+        """Init."""
+        super().__init__()
+        self._exact: dict[str, Any] = {}
+        self._wildcards = MQTTMatcher()
+        self._wildcard_keys = set[str]()
+        self._wildcard_roots = frozenset[str]()
+        self._cache: dict[str, tuple[Any, ...]] = {}
+        self._cache_gen = 0
+
+    def __setitem__(self, topic: str, value: Any) -> None:
+        """Add a topic filter."""
+        super().__setitem__(topic, value)
+        if "+" in topic or "#" in topic:
+            self._cache_gen += 1  # before the change, see match
+            self._wildcards[topic] = value
+            self._wildcard_keys.add(topic)
+            self._clear_cache()
+        else:
+            self._exact[topic] = value
+
+    def __getitem__(self, topic: str) -> Any:
+        """Return the value associated with a topic filter."""
+        try:
+            return self._exact[topic]
+        except KeyError:
+            return super().__getitem__(topic)
+
+    def __delitem__(self, topic: str) -> None:
+        """Remove a topic filter."""
+        super().__delitem__(topic)
+        if topic in self._wildcard_keys:
+            self._cache_gen += 1
+            del self._wildcards[topic]
+            self._wildcard_keys.discard(topic)
+            self._clear_cache()
+        else:
+            self._exact.pop(topic, None)
+
+    def _clear_cache(self) -> None:
+        """Invalidate the wildcard match cache."""
+        self._wildcard_roots = frozenset(
+            k.partition("/")[0] for k in self._wildcard_keys
+        )
+        self._cache_gen += 1
+        self._cache.clear()
 
     def keys(self) -> Generator[str]:
         """Return all keys."""
@@ -410,11 +1289,7 @@ class MQTTMatcher2(MQTTMatcher):
 
     def __contains__(self, topic: str) -> bool:
         """Check whether a topic is actively subscribed."""
-        try:
-            next(self.iter_match(topic))
-            return True
-        except StopIteration:
-            return False
+        return bool(self.match(topic))
 
     def pop(self, topic: str) -> None:
         """Remove a topic from the active subscriptions."""
@@ -423,6 +1298,29 @@ class MQTTMatcher2(MQTTMatcher):
         except KeyError:  # no such subscription
             pass
 
-    def iter_match(self, topic: str) -> Generator[TopicCallback]:
+    def match(self, topic: str) -> tuple[TopicHandler, ...]:
+        """Return all values associated with filters that match the :topic."""
+        exact = self._exact.get(topic)
+        roots = self._wildcard_roots
+        if not ("+" in roots or "#" in roots or topic.partition("/")[0] in roots):
+            return () if exact is None else (exact,)
+
+        matches = self._cache.get(topic)
+        if matches is None:
+            # A filter added by the event loop while matching on paho's thread
+            # must not leave a stale result in the cache. The generation changes
+            # before & after the filters change, a result stored while they
+            # changed is removed again.
+            gen = self._cache_gen
+            matches = tuple(self._wildcards.iter_match(topic))
+            if gen == self._cache_gen:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[topic] = matches
+                if gen != self._cache_gen:
+                    self._cache.pop(topic, None)
+        return matches if exact is None else (exact, *matches)
+
+    def iter_match(self, topic: str) -> Generator[TopicHandler]:
         """Return an iterator on all values associated with filters that match the :topic."""
-        yield from super().iter_match(topic)
+        yield from self.match(topic)
@@ -1,10 +1,23 @@
 """HASS MQTT Device, used for device based discovery."""
 
+import logging
+from collections.abc import Mapping
 from dataclasses import dataclass, field
-from typing import Any
+from json import JSONDecodeError, dumps, loads
+from typing import Any, ClassVar
 
 from .entities import MQTTBaseEntity
-from .helpers import DEVREG_ABBREVIATE, ORIGIN_ABBREVIATE, as_dict, hass_abbreviate
+from .helpers import (
+    ABBREVIATE,
+    DEVREG_ABBREVIATE,
+    MQTT_EXPLORER_LIMIT,
+    ORIGIN_ABBREVIATE,
+    TrackChanges,
+    as_dict,
+    hass_abbreviate,
+)
+
+_LOG = logging.getLogger(__name__)
 
 
 @dataclass
@@ -23,7 +36,7 @@ M_DEV = {"dev": True}
 
 
 @dataclass
-class MQTTDevice:
+class MQTTDevice(TrackChanges):
     """Base class for MQTT Device Discovery. A Home Assistant Device groups entities."""
 
     identifiers: list[str | tuple[str, Any]] = field(metadata=M_DEV)
@@ -48,6 +61,25 @@ class MQTTDevice:
     command_topic: str = field(default="", metadata=M_SHARED)
     qos: str = field(default="", metadata=M_SHARED)
 
+    _untracked: ClassVar[frozenset[str]] = frozenset({"components"})
+    """Components are part of the discovery key, with their own snapshot."""
+
+    _discovery_cache: tuple[tuple, str, str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    """The discovery payload & the state it was created from."""
+    _discovery_split_cache: tuple[tuple, list[tuple[str, str]]] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _discovery_parts: dict[str, tuple[int, str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    """The part & platform of each component, once split into several payloads."""
+    _discovery_part_ids: set[int] = field(
+        default_factory=set, init=False, repr=False, compare=False
+    )
+    """The parts published by the last split, or retained by a previous run."""
+
     def __post_init__(self) -> None:
         """Post init."""
         if not self.identifiers:
@@ -63,16 +95,19 @@ class MQTTDevice:
     ) -> tuple[str, dict[str, Any]]:
         """Return the discovery dictionary for the MQTT device."""
         cmps = {
-            k: hass_abbreviate(v.as_discovery_dict) for k, v in self.components.items()
+            k: (
+                hass_abbreviate(v.as_discovery_dict)  # overridden by a subclass
+                if type(v).as_discovery_dict is not MQTTBaseEntity.as_discovery_dict
+                else v.discovery_dict(ABBREVIATE)
+            )
+            for k, v in self.components.items()
         }
         for key, platform in self.remove_components.items():
             cmps[key] = {"p": cmps[key]["p"] if key in cmps else platform}
 
         disco_json = {
-            "dev": hass_abbreviate(
-                as_dict(self, metadata_key="dev"), abbreviations=DEVREG_ABBREVIATE
-            ),
-            "o": hass_abbreviate(as_dict(origin), abbreviations=ORIGIN_ABBREVIATE),
+            "dev": as_dict(self, metadata_key="dev", abbreviations=DEVREG_ABBREVIATE),
+            "o": as_dict(origin, abbreviations=ORIGIN_ABBREVIATE),
         }
         if shared := as_dict(self, metadata_key="shared"):
             disco_json.update(shared)
@@ -82,3 +117,204 @@ class MQTTDevice:
         disco_json["cmps"] = cmps
 
         return f"homeassistant/device/{self.id}/config", disco_json
+
+    def discovery_payload(
+        self, availability_topic: str, *, origin: MQTTOrigin
+    ) -> tuple[str, str]:
+        """Return the discovery topic & JSON payload for the MQTT device.
+
+        The payload is cached until the device, a component or the arguments change.
+        """
+        key = self._discovery_key(availability_topic, origin)
+        cache = self._discovery_cache
+        if cache and cache[0] == key:
+            return cache[1], cache[2]
+
+        topic, disco_dict = self.discovery_info(availability_topic, origin=origin)
+        payload = _dumps(disco_dict)
+        # If as_discovery_dict migrated component fields, the next call rebuilds once
+        self._discovery_cache = (key, topic, payload)
+        return topic, payload
+
+    def discovery_payloads(
+        self, availability_topic: str, *, origin: MQTTOrigin, max_bytes: int = 0
+    ) -> list[tuple[str, str]]:
+        """Return the discovery topics & JSON payloads for the MQTT device.
+
+        If the payload is larger than max_bytes, the components are split over
+        several payloads that share the device & origin. The first part uses the
+        device's topic, others homeassistant/device/{id}_{part}/config.
+        Components stay in their part when the device changes. Components that
+        were removed or had to move are removed from their previous part. Parts
+        that are no longer required get an empty payload. Use
+        restore_discovery_parts to continue the split of a previous run.
+        """
+        topic, payload = self.discovery_payload(availability_topic, origin=origin)
+        if not max_bytes or (
+            len(payload) <= max_bytes and not self._discovery_part_ids
+        ):
+            return [(topic, payload)]
+
+        key = (self._discovery_cache[0] if self._discovery_cache else (), max_bytes)
+        cache = self._discovery_split_cache
+        if cache and cache[0] == key:
+            return cache[1]
+
+        _, disco = self.discovery_info(availability_topic, origin=origin)
+        cmps: dict[str, dict[str, Any]] = disco.pop("cmps")
+        result = self._merge_parts(disco, cmps, max_bytes) or self._split(
+            disco, cmps, max_bytes
+        )
+        self._discovery_split_cache = (key, result)
+        return result
+
+    def _merge_parts(
+        self, disco: dict[str, Any], cmps: dict[str, dict[str, Any]], max_bytes: int
+    ) -> list[tuple[str, str]]:
+        """Return a single payload & clear the other parts, if the device fits."""
+        prev = self._discovery_parts
+        gone = {k: {"p": p} for k, (i, p) in prev.items() if not i and k not in cmps}
+        single = _dumps({**disco, "cmps": {**cmps, **gone}})
+        if len(single) > max_bytes:
+            return []
+        result = [
+            (self._part_topic(i), "") for i in sorted(self._discovery_part_ids - {0})
+        ]
+        result.append((self._part_topic(0), single))
+        self._discovery_parts, self._discovery_part_ids = {}, set()
+        return result
+
+    def _split(
+        self, disco: dict[str, Any], cmps: dict[str, dict[str, Any]], max_bytes: int
+    ) -> list[tuple[str, str]]:
+        """Split the components over several payloads of at most max_bytes."""
+        prev = self._discovery_parts
+        prev_ids = self._discovery_part_ids
+        base = len(dumps({**disco, "cmps": {}}))
+        # The size of each component, including the separator
+        sizes = {k: len(dumps({k: v})) for k, v in cmps.items()}
+
+        placed: dict[str, tuple[int, str]] = {}
+        parts: dict[int, dict[str, Any]] = {}
+        used: dict[int, int] = {}
+        removed = set[int]()
+        last = max(prev_ids, default=-1)
+
+        # Reserve space for a removal marker of every component in its part
+        markers = {k: {"p": platform} for k, (_, platform) in prev.items()}
+        msizes = {k: len(dumps({k: m})) for k, m in markers.items()}
+        for ckey, (idx, _) in prev.items():
+            used[idx] = used.get(idx, base) + msizes[ckey]
+
+        def _add(idx: int, ckey: str, cmp: dict[str, Any], size: int) -> None:
+            parts.setdefault(idx, {})[ckey] = cmp
+            used[idx] = used.get(idx, base) + size
+
+        def _remove(ckey: str) -> None:
+            """Remove a component from its previous part."""
+            idx = prev[ckey][0]
+            _add(idx, ckey, markers[ckey], 0)
+            removed.add(idx)
+
+        for ckey in prev.keys() - cmps.keys():
+            _remove(ckey)
+        new = list[str]()
+        for ckey, cmp in cmps.items():
+            if ckey in prev:
+                idx, size = prev[ckey][0], sizes[ckey] - msizes[ckey]
+                if cmp.keys() != {"p"} and used[idx] + size <= max_bytes:
+                    _add(idx, ckey, cmp, size)
+                    placed[ckey] = (idx, cmp.get("p", ""))
+                    continue
+                _remove(ckey)
+                if cmp.keys() == {"p"}:
+                    continue  # remove_components
+            new.append(ckey)
+
+        for ckey in new:
+            if cmps[ckey].keys() == {"p"}:
+                # remove_components of an unknown part, the device's own topic
+                _add(0, ckey, cmps[ckey], sizes[ckey])
+                continue
+            idx = next(
+                (i for i in sorted(used) if used[i] + sizes[ckey] <= max_bytes), -1
+            )
+            if idx < 0:
+                last = idx = last + 1
+                if base + sizes[ckey] > max_bytes:
+                    _LOG.warning(
+                        "MQTT: Discovery component %s is larger than %s bytes",
+                        ckey,
+                        max_bytes,
+                    )
+            _add(idx, ckey, cmps[ckey], sizes[ckey])
+            placed[ckey] = (idx, cmps[ckey].get("p", ""))
+        self._discovery_parts = placed
+        self._discovery_part_ids = set(parts)
+
+        # Clear & remove components before they are added to another part
+        result = [(self._part_topic(i), "") for i in sorted(prev_ids - parts.keys())]
+        result.extend(
+            (self._part_topic(idx), _dumps({**disco, "cmps": parts[idx]}))
+            for idx in sorted(parts, key=lambda i: (i not in removed, i))
+        )
+        return result
+
+    def restore_discovery_parts(self, retained: Mapping[str, bytes]) -> None:
+        """Continue the split of a previous run, from its retained payloads.
+
+        Only the device's own topics are used. Ignored if the previous run did
+        not split the device.
+        """
+        prefix = f"homeassistant/device/{self.id}"
+        payloads = dict[int, bytes]()
+        for topic, payload in retained.items():
+            if not (topic.startswith(prefix) and topic.endswith("/config")):
+                continue
+            part = topic[len(prefix) : -len("/config")]
+            if not part:
+                payloads[0] = payload
+            elif part[0] == "_" and part[1:].isdigit():
+                payloads[int(part[1:])] = payload
+        if not payloads.keys() - {0}:
+            return
+
+        parts = dict[str, tuple[int, str]]()
+        for idx, payload in payloads.items():
+            try:
+                cmps = loads(payload)["cmps"]
+            except (JSONDecodeError, KeyError, TypeError) as err:
+                _LOG.warning("MQTT: Invalid retained discovery %s: %s", idx, err)
+                continue
+            for ckey, cmp in cmps.items():
+                if cmp.keys() != {"p"}:  # not a removal marker
+                    parts[ckey] = (idx, cmp.get("p", ""))
+        self._discovery_parts = parts
+        self._discovery_part_ids = set(payloads)
+        self._discovery_split_cache = None
+
+    def _part_topic(self, idx: int) -> str:
+        """Return the discovery topic of a part."""
+        return f"homeassistant/device/{self.id}{f'_{idx}' if idx else ''}/config"
+
+    def _discovery_key(self, availability_topic: str, origin: MQTTOrigin) -> tuple:
+        """Return the state the discovery payload depends on."""
+        return (
+            availability_topic,
+            origin.name,
+            origin.sw,
+            origin.url,
+            self.discovery_state(),
+            tuple(
+                (k, v.__class__, v.discovery_state())
+                for k, v in self.components.items()
+            ),
+        )
+
+
+def _dumps(disco: dict[str, Any]) -> str:
+    """Serialize a discovery payload, compact if larger than MQTT_EXPLORER_LIMIT."""
+    payload = dumps(disco)
+    if len(payload) > MQTT_EXPLORER_LIMIT:
+        payload = dumps(disco, indent=None, separators=(",", ":"))
+    return payload
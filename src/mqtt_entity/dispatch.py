@@ -0,0 +1,171 @@
+"""Ordered, bounded dispatch of async topic callbacks."""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
+from typing import Any, Literal
+
+_LOG = logging.getLogger(__name__)
+
+type Job = Callable[[], Coroutine[Any, Any, None]]
+type Overflow = Literal["drop_oldest", "drop_newest", "block"]
+
+
+@dataclass
+class TopicDispatcher:
+    """Run async callbacks in order per topic, with bounded concurrency.
+
+    A topic is handled by one worker at a time, so messages on a topic are
+    processed in the order they were received. Up to `concurrency` topics are
+    processed in parallel.
+    """
+
+    concurrency: int = 8
+    """Maximum number of topics processed in parallel."""
+    queue_size: int = 100
+    """Maximum number of queued messages per topic."""
+    overflow: Overflow = "drop_oldest"
+    """When a topic queue is full: drop the oldest or the newest message, or block.
+
+    With block, paho stops reading from the broker until there is space. A
+    topic's backlog, also counting messages not yet handed to the dispatcher, is
+    kept within queue_size. Callbacks should not wait for delivery acks.
+    """
+    block_timeout: float = 10
+    """Maximum time to block paho's network thread per message."""
+
+    dropped: int = field(default=0, init=False)
+    """Number of dropped messages."""
+
+    space: threading.Event = field(default_factory=threading.Event, repr=False)
+    """Set while all topic queues have space."""
+    on_space: Callable[[], None] | None = field(default=None, repr=False)
+    """Called on the event loop when there is space again."""
+
+    _queues: dict[str, deque[Job]] = field(default_factory=dict, repr=False)
+    _ready: deque[str] = field(default_factory=deque, repr=False)
+    """Topics with queued messages that are not handled by a worker."""
+    _full: set[str] = field(default_factory=set, repr=False)
+    _workers: set[asyncio.Task] = field(default_factory=set, repr=False)
+    _backlog: dict[str, int] = field(default_factory=dict, repr=False)
+    """Messages per topic accepted by wait_space & not yet started by a worker."""
+    _backlog_cond: threading.Condition = field(
+        default_factory=threading.Condition, repr=False
+    )
+
+    def __post_init__(self) -> None:
+        """Init."""
+        if self.concurrency < 1 or self.queue_size < 1:
+            raise ValueError("concurrency and queue_size must be at least 1")
+        self.space.set()
+
+    @property
+    def pending(self) -> int:
+        """Number of queued messages."""
+        return sum(len(q) for q in self._queues.values())
+
+    def submit(self, topic: str, job: Job) -> None:
+        """Queue a job for a topic. Call from the event loop."""
+        queue = self._queues.get(topic)
+        if queue is None:
+            queue = self._queues[topic] = deque()
+            self._ready.append(topic)
+        elif len(queue) >= self.queue_size:
+            if self.overflow == "drop_newest":
+                self._drop(topic)
+                return
+            if self.overflow == "drop_oldest":
+                queue.popleft()
+                self._drop(topic)
+
+        queue.append(job)
+        if self.overflow == "block" and len(queue) >= self.queue_size:
+            self._full.add(topic)
+            self.space.clear()
+
+        while len(self._workers) < min(self.concurrency, len(self._ready)):
+            task = asyncio.get_running_loop().create_task(self._worker())
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+
+    def _drop(self, topic: str) -> None:
+        """Count a dropped message."""
+        self.dropped += 1
+        _LOG.warning(
+            "MQTT: Dispatch queue full for %s, dropped %s message (total %s)",
+            topic,
+            "oldest" if self.overflow == "drop_oldest" else "newest",
+            self.dropped,
+        )
+
+    def wait_space(self, topic: str) -> None:
+        """Block paho's network thread while the topic's backlog is full.
+
+        The message is counted in the backlog until a worker starts it, so
+        messages queued between paho's thread & the event loop are included.
+        """
+        if self.overflow != "block":
+            return
+        with self._backlog_cond:
+            if not self._backlog_cond.wait_for(
+                lambda: self._backlog.get(topic, 0) < self.queue_size,
+                self.block_timeout,
+            ):
+                _LOG.warning(
+                    "MQTT: Dispatch queue %s still full after %ss",
+                    topic,
+                    self.block_timeout,
+                )
+            self._backlog[topic] = self._backlog.get(topic, 0) + 1
+
+    def _started(self, topic: str) -> None:
+        """Remove a started message from the topic's backlog."""
+        with self._backlog_cond:
+            count = self._backlog.get(topic)
+            if count is None:
+                return  # submitted without wait_space (native_loop)
+            if count > 1:
+                self._backlog[topic] = count - 1
+            else:
+                del self._backlog[topic]
+            self._backlog_cond.notify_all()
+
+    async def _worker(self) -> None:
+        """Process topics until no topics are ready."""
+        while self._ready:
+            topic = self._ready.popleft()
+            queue = self._queues[topic]
+            job = queue.popleft()
+            if self._backlog:
+                self._started(topic)
+            if topic in self._full and len(queue) < self.queue_size:
+                self._full.discard(topic)
+                if not self._full:
+                    self.space.set()
+                    if self.on_space:
+                        self.on_space()
+            try:
+                await job()
+            except Exception as err:
+                _LOG.error("MQTT: Exception in dispatch for topic %s: %s", topic, err)
+            # Take turns with other ready topics, this topic stays in order
+            if queue:
+                self._ready.append(topic)
+            else:
+                del self._queues[topic]
+
+    def close(self) -> None:
+        """Cancel all workers & drop queued messages."""
+        for task in self._workers:
+            task.cancel()
+        self._workers.clear()
+        self._queues.clear()
+        self._ready.clear()
+        self._full.clear()
+        self.space.set()
+        with self._backlog_cond:
+            self._backlog.clear()
+            self._backlog_cond.notify_all()
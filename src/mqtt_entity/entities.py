@@ -2,21 +2,27 @@
 
 from __future__ import annotations
 
+import time
 import warnings
 from collections.abc import Sequence
 from dataclasses import dataclass, field
 from json import dumps
 from typing import TYPE_CHECKING, Any
 
-from .helpers import as_dict
-from .utils import BOOL_OFF, BOOL_ON, tostr
+from .helpers import M_INTERNAL, TrackChanges, as_dict
+from .utils import BOOL_OFF, BOOL_ON, tofloat, tostr
 
 if TYPE_CHECKING:
     from .client import MQTTAsyncClient, TopicCallback
 
 
+def _key(name: str, abbreviations: dict[str, str] | None) -> str:
+    """Return the (abbreviated) discovery key."""
+    return abbreviations.get(name, name) if abbreviations else name
+
+
 @dataclass
-class MQTTBaseEntity:
+class MQTTBaseEntity(TrackChanges):
     """Base class for entities that support MQTT Discovery."""
 
     @property
@@ -27,7 +33,13 @@ class MQTTBaseEntity:
     @property
     def as_discovery_dict(self) -> dict[str, Any]:
         """Discovery dict."""
-        return as_dict(self)
+        return self.discovery_dict()
+
+    def discovery_dict(
+        self, abbreviations: dict[str, str] | None = None
+    ) -> dict[str, Any]:
+        """Discovery dict, with keys abbreviated if abbreviations are provided."""
+        return as_dict(self, abbreviations=abbreviations)
 
 
 @dataclass
@@ -66,18 +78,86 @@ class MQTTEntity(MQTTBaseEntity):
     discovery_extra: dict[str, Any] = field(default_factory=dict)
     """Additional MQTT Discovery attributes."""
 
+    state_cache: bool = field(default=False, metadata=M_INTERNAL)
+    """Only publish a state if it differs from the last published state.
+    Ignored if force_update or expire_after is set."""
+    states_suppressed: int = field(
+        default=0, init=False, repr=False, compare=False, metadata=M_INTERNAL
+    )
+    """Number of states not published by the state cache or numeric filters."""
+    _last_state: str | None = field(
+        default=None, init=False, repr=False, compare=False, metadata=M_INTERNAL
+    )
+    _last_value: float | None = field(
+        default=None, init=False, repr=False, compare=False, metadata=M_INTERNAL
+    )
+    _last_time: float = field(
+        default=0.0, init=False, repr=False, compare=False, metadata=M_INTERNAL
+    )
+
     platform = ""
 
+    # Numeric state filters, fields of MQTTSensorEntity & MQTTNumberEntity
+    deadband = 0.0
+    deadband_percent = 0.0
+    min_interval = 0.0
+    suggested_display_precision = 0
+
     def __post_init__(self) -> None:
         """Init the class."""
         if not self.platform:
             raise TypeError(f"Do not instantiate {self.__class__.__name__} directly")
 
     async def send_state(
-        self, client: MQTTAsyncClient, payload: Any, *, retain: bool = False
+        self,
+        client: MQTTAsyncClient,
+        payload: Any,
+        *,
+        retain: bool = False,
+        force: bool = False,
     ) -> None:
-        """Publish the state to the MQTT state topic."""
-        await client.publish(self.state_topic, tostr(payload), retain=retain)
+        """Publish the state to the MQTT state topic.
+
+        States filtered by state_cache or the numeric deadband & min_interval
+        are only published if force is set.
+        """
+        state = tostr(payload)
+        value = None
+        if self.deadband or self.deadband_percent or self.min_interval:
+            value = tofloat(payload, self.suggested_display_precision)
+        if not force and self._skip_state(state, value):
+            self.states_suppressed += 1
+            return
+        await client.publish(self.state_topic, state, retain=retain, buffered=True)
+        self._last_state = state
+        self._last_value = value
+        self._last_time = time.monotonic()
+
+    def _skip_state(self, state: str, value: float | None) -> bool:
+        """Return True if the state should not be published."""
+        if (
+            self.state_cache
+            and state == self._last_state
+            and not self.expire_after
+            and not getattr(self, "force_update", False)
+        ):
+            return True
+        if value is None or self._last_value is None:
+            return False  # not numeric, or first value
+        if (
+            self.min_interval
+            and time.monotonic() - self._last_time >= self.min_interval
+        ):
+            return False
+        if not (self.deadband or self.deadband_percent):
+            return bool(self.min_interval)
+        band = max(self.deadband, abs(self._last_value) * self.deadband_percent / 100)
+        return abs(value - self._last_value) <= band
+
+    def clear_state_cache(self) -> None:
+        """Publish the next state, even if unchanged. I.e. when Home Assistant restarts."""
+        self._last_state = None
+        self._last_value = None
 
     async def send_json_attributes(
         self,
@@ -88,12 +168,16 @@ class MQTTEntity(MQTTBaseEntity):
     ) -> None:
         """Publish the attributes to the MQTT JSON attributes topic."""
         await client.publish(
-            topic=self.json_attributes_topic, payload=dumps(attributes), retain=retain
+            topic=self.json_attributes_topic,
+            payload=dumps(attributes),
+            retain=retain,
+            buffered=True,
         )
 
-    @property
-    def as_discovery_dict(self) -> dict[str, Any]:
-        """Discovery dict."""
+    def discovery_dict(
+        self, abbreviations: dict[str, str] | None = None
+    ) -> dict[str, Any]:
+        """Discovery dict, with keys abbreviated if abbreviations are provided."""
         # Migrate object_id to default_entity_id
         if self.object_id and not self.default_entity_id:
             warnings.warn(
@@ -113,8 +197,8 @@ class MQTTEntity(MQTTBaseEntity):
         if not self.state_class and self.device_class == "energy":
             self.state_class = "total_increasing"
 
-        res = super().as_discovery_dict
-        res.setdefault("platform", self.platform)
+        res = super().discovery_dict(abbreviations)
+        res.setdefault(_key("platform", abbreviations), self.platform)
         return res
 
 
@@ -142,12 +226,13 @@ class MQTTDeviceTrigger(MQTTBaseEntity):
     discovery_extra: dict[str, Any] = field(default_factory=dict)
     """Additional MQTT Discovery attributes."""
 
-    @property
-    def as_discovery_dict(self) -> dict[str, Any]:
+    def discovery_dict(
+        self, abbreviations: dict[str, str] | None = None
+    ) -> dict[str, Any]:
         """Return the final discovery dictionary."""
-        result = super().as_discovery_dict
-        result["automation_type"] = "trigger"
-        result["platform"] = "device_automation"
+        result = super().discovery_dict(abbreviations)
+        result[_key("automation_type", abbreviations)] = "trigger"
+        result[_key("platform", abbreviations)] = "device_automation"
         return result
 
 
@@ -187,6 +272,14 @@ class MQTTSensorEntity(MQTTEntity):
     suggested_display_precision: int = 0
     """The number of decimals which should be used in the sensor's state after rounding."""
 
+    deadband: float = field(default=0.0, metadata=M_INTERNAL)
+    """Only publish a numeric state if it changed by more than this value."""
+    deadband_percent: float = field(default=0.0, metadata=M_INTERNAL)
+    """Only publish a numeric state if it changed by more than this % of the last state."""
+    min_interval: float = field(default=0.0, metadata=M_INTERNAL)
+    """Seconds between publishing numeric states. With a deadband, changes outside
+    the deadband are published immediately & smaller changes after min_interval."""
+
     platform = "sensor"
 
 
@@ -261,6 +354,7 @@ class MQTTLightEntity(MQTTRWEntity):
             self.brightness_state_topic,
             str(brightness),
             retain=retain,
+            buffered=True,
         )
 
     async def send_effect(
@@ -271,6 +365,7 @@ class MQTTLightEntity(MQTTRWEntity):
             self.effect_state_topic,
             effect,
             retain=retain,
+            buffered=True,
         )
 
     async def send_hs(
@@ -281,6 +376,7 @@ class MQTTLightEntity(MQTTRWEntity):
             self.hs_state_topic,
             f"{hs[0]},{hs[1]}",
             retain=retain,
+            buffered=True,
         )
 
     @property
@@ -308,4 +404,12 @@ class MQTTNumberEntity(MQTTRWEntity):
     suggested_display_precision: int = 0
     """The number of decimals which should be used in the sensor's state after rounding."""
 
+    deadband: float = field(default=0.0, metadata=M_INTERNAL)
+    """Only publish a numeric state if it changed by more than this value."""
+    deadband_percent: float = field(default=0.0, metadata=M_INTERNAL)
+    """Only publish a numeric state if it changed by more than this % of the last state."""
+    min_interval: float = field(default=0.0, metadata=M_INTERNAL)
+    """Seconds between publishing numeric states. With a deadband, changes outside
+    the deadband are published immediately & smaller changes after min_interval."""
+
     platform = "number"
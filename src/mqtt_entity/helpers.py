@@ -1,15 +1,21 @@
 """Helpers."""
 
+import copy
 import dataclasses
 import inspect
 import logging
 import os
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable
+from functools import cache
 from pathlib import Path
-from typing import Any, NotRequired, TypedDict
+from typing import Any, ClassVar, NotRequired, TypedDict
 
 _LOG = logging.getLogger(__name__)
 
+M_INTERNAL = {"internal": True}
+"""Field metadata for library options & state, never part of discovery."""
+MQTT_EXPLORER_LIMIT = 20000
+
 
 # class DataclassInstance(Protocol):
 #     """Dataclass class."""
@@ -21,27 +27,19 @@ def as_dict(
     obj: Any,
     exclude: Iterable[str] | None = None,
     metadata_key: str = "",
+    abbreviations: dict[str, str] | None = None,
 ) -> dict[str, Any]:
-    """Represent the object as a dictionary, without empty values and defaults."""
+    """Represent the object as a dictionary, without empty values and defaults.
 
-    def _filter(atrb: dataclasses.Field, value: Any) -> bool:
-        if not value or atrb.default == value:
-            return False
-        if exclude and atrb.name in exclude:
-            return False
-        if metadata_key:
-            return bool(atrb.metadata.get(metadata_key))
-        if atrb.name in ("discovery_extra",):
-            return False
-        return not inspect.isfunction(value)
-
-    res = {
-        k: v
-        for k, v in dataclasses.asdict(obj).items()
-        if _filter(obj.__dataclass_fields__[k], v)
-    }
+    With abbreviations, keys are abbreviated as by hass_abbreviate.
+    """
+    res = _serializer(type(obj), frozenset(exclude or ()), metadata_key, abbreviations)(
+        obj
+    )
 
     if extra := getattr(obj, "discovery_extra", None):
+        if abbreviations:
+            extra = {abbreviations.get(k, k): v for k, v in extra.items()}
         keys = {k: extra[k] for k in extra if k in res and res[k] != extra[k]}
         _LOG.debug("Overwriting %s", keys)
         res.update(extra)
@@ -49,6 +47,173 @@ def as_dict(
     return res
 
 
+_ATOMIC = frozenset((str, int, float, bool, type(None)))
+
+
+def _copy_value(value: Any) -> Any:
+    """Copy a field value, like dataclasses.asdict does."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, tuple) and hasattr(value, "_fields"):  # namedtuple
+        return type(value)(*(_copy_value(v) for v in value))
+    if isinstance(value, list | tuple):
+        return type(value)(_copy_value(v) for v in value)
+    if isinstance(value, dict):
+        return {_copy_value(k): _copy_value(v) for k, v in value.items()}
+    return copy.deepcopy(value)
+
+
+_SERIALIZERS: dict[tuple, Callable[[Any], dict[str, Any]]] = {}
+
+
+def _serializer(
+    cls: type,
+    exclude: frozenset[str],
+    metadata_key: str,
+    abbreviations: dict[str, str] | None,
+) -> Callable[[Any], dict[str, Any]]:
+    """Generate the as_dict function for a dataclass, without discovery_extra.
+
+    Fields & their (abbreviated) keys are resolved once. Per field, the generated
+    code reads the value & skips empty & default values. Non-atomic values are
+    copied & functions skipped.
+
+    The module's abbreviation tables are identified by id, other tables by
+    their content.
+    """
+    table: Any = id(abbreviations)
+    if abbreviations is not None and not any(
+        abbreviations is t for t in (ABBREVIATE, DEVREG_ABBREVIATE, ORIGIN_ABBREVIATE)
+    ):
+        table = frozenset(abbreviations.items())
+    key = (cls, exclude, metadata_key, table)
+    if key in _SERIALIZERS:
+        return _SERIALIZERS[key]
+
+    lines = ["def as_dict(obj):", "    res = {}"]
+    env: dict[str, Any] = {
+        "_ATOMIC": _ATOMIC,
+        "_copy_value": _copy_value,
+        "_isfunction": inspect.isfunction,
+    }
+    for idx, atrb in enumerate(dataclasses.fields(cls)):
+        if atrb.name in exclude:
+            continue
+        if metadata_key:
+            if not atrb.metadata.get(metadata_key):
+                continue
+        elif atrb.metadata.get("internal") or atrb.name == "discovery_extra":
+            continue
+        lines += [
+            f"    v = obj.{atrb.name}",
+            "    if v.__class__ not in _ATOMIC:",
+            "        v = _copy_value(v)",
+        ]
+        if not metadata_key:
+            lines.append("        if _isfunction(v): v = None")
+        if atrb.default is dataclasses.MISSING:
+            lines.append("    if v:")
+        else:
+            env[f"_d{idx}"] = atrb.default
+            lines.append(f"    if v and not _d{idx} == v:")
+        name = abbreviations.get(atrb.name, atrb.name) if abbreviations else atrb.name
+        lines.append(f"        res[{name!r}] = v")
+    lines.append("    return res")
+
+    exec("\n".join(lines), env)
+    _SERIALIZERS[key] = env["as_dict"]
+    return env["as_dict"]
+
+
+def _freeze(value: Any) -> Any:
+    """Return a snapshot of a field value, lists & dicts are copied to tuples."""
+    if isinstance(value, dict | list | tuple):
+        if not value:
+            return ()
+        if isinstance(value, dict):
+            return tuple(
+                (k, v if v.__class__ in _ATOMIC else _freeze(v))
+                for k, v in value.items()
+            )
+        return tuple(v if v.__class__ in _ATOMIC else _freeze(v) for v in value)
+    if isinstance(value, set | frozenset):
+        return frozenset(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return (
+            value.__class__,
+            *(_freeze(getattr(value, f.name)) for f in dataclasses.fields(value)),
+        )
+    return value
+
+
+_SCALARS = frozenset((str, int, float, bool, "str", "int", "float", "bool"))
+
+
+@cache
+def _tracked(cls: type) -> frozenset[str]:
+    """Return the public, non-M_INTERNAL & not untracked fields of a dataclass."""
+    untracked: frozenset[str] = getattr(cls, "_untracked", frozenset())
+    return frozenset(
+        f.name
+        for f in dataclasses.fields(cls)
+        if f.name[0] != "_"
+        and not f.metadata.get("internal")
+        and f.name not in untracked
+    )
+
+
+@cache
+def _snapshot(cls: type) -> Callable[[Any], tuple]:
+    """Generate a function that returns the tracked values not annotated as scalars.
+
+    Empty lists & dicts are represented by (), others are copied to tuples.
+    """
+    tracked = _tracked(cls)
+    names = [
+        f.name
+        for f in dataclasses.fields(cls)
+        if f.name in tracked and f.type not in _SCALARS
+    ]
+    lines = ["def snapshot(obj):"]
+    lines += [f"    v{idx} = obj.{name}" for idx, name in enumerate(names)]
+    values = "".join(
+        f"v{idx} if v{idx}.__class__ in _ATOMIC else _freeze(v{idx}) if v{idx} else (), "
+        for idx in range(len(names))
+    )
+    lines.append(f"    return ({values})")
+    env: dict[str, Any] = {"_ATOMIC": _ATOMIC, "_freeze": _freeze}
+    exec("\n".join(lines), env)
+    return env["snapshot"]
+
+
+class TrackChanges:
+    """Track the state that affects the discovery info.
+
+    Assigning a public, non-M_INTERNAL field increments the discovery version.
+    Fields not annotated as str, int, float or bool (lists, dicts, ...) are
+    also copied to a snapshot, so in-place changes are detected. Call
+    invalidate_discovery if the discovery info depends on anything else.
+    """
+
+    _discovery_version = 0
+    _untracked: ClassVar[frozenset[str]] = frozenset()
+    """Fields that are not tracked."""
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute, count changes of tracked fields."""
+        object.__setattr__(self, name, value)
+        if name[0] != "_" and name in _tracked(type(self)):
+            object.__setattr__(self, "_discovery_version", self._discovery_version + 1)
+
+    def discovery_state(self) -> tuple:
+        """Return the version & a snapshot of the non-scalar fields."""
+        return (self._discovery_version, _snapshot(type(self))(self))
+
+    def invalidate_discovery(self) -> None:
+        """Mark the discovery info as changed."""
+        object.__setattr__(self, "_discovery_version", self._discovery_version + 1)
+
+
 def hass_abbreviate(
     result: dict[str, Any], *, abbreviations: dict[str, str] | None = None
 ) -> dict[str, Any]:
@@ -119,6 +284,7 @@ class MQTTEntityOptions(TypedDict):
     unit_of_measurement: NotRequired[str]
 
     discovery_extra: NotRequired[dict[str, Any]]
+    state_cache: NotRequired[bool]
 
 
 def swapkv(d: dict[str, str]) -> dict[str, str]:
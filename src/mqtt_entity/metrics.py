@@ -0,0 +1,262 @@
+"""Runtime metrics of the MQTT client & a Prometheus text exporter."""
+
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+_LOG = logging.getLogger(__name__)
+
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+"""Histogram bucket upper bounds in seconds."""
+COUNTERS = (
+    "messages_in",
+    "messages_out",
+    "bytes_in",
+    "bytes_out",
+    "connects",
+    "reconnects",
+)
+
+
+@dataclass(slots=True)
+class Histogram:
+    """Histogram of durations in seconds."""
+
+    counts: list[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    """Observations per bucket, the last bucket is +Inf. Not cumulative."""
+    count: int = 0
+    sum: float = 0.0
+    max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the count, sum, max & cumulative buckets."""
+        cumulative, total = {}, 0
+        for bound, cnt in zip((*BUCKETS, float("inf")), self.counts, strict=True):
+            total += cnt
+            cumulative[str(bound)] = total
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": cumulative,
+        }
+
+
+@dataclass
+class Metrics:
+    """Counters & histograms, updated by the client."""
+
+    messages_in: int = 0
+    messages_out: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    waiting: int = 0
+    """Calls waiting in wait_connected, mostly publishes."""
+    connects: int = 0
+    reconnects: int = 0
+    connect_time: Histogram = field(default_factory=Histogram)
+    """Time from connect() or a lost connection until connected."""
+    callbacks: dict[str, Histogram] = field(default_factory=dict)
+    """Callback execution time, by callback name."""
+    slow_callbacks: dict[str, int] = field(default_factory=dict)
+    """Callbacks slower than the client's threshold, by callback name."""
+    loop_lag: Histogram = field(default_factory=Histogram)
+    """Event loop scheduling delay, measured by LoopLagProbe."""
+
+    def observe_callback(self, name: str, duration: float) -> None:
+        """Add a callback execution time."""
+        try:
+            self.callbacks[name].observe(duration)
+        except KeyError:
+            self.callbacks[name] = hist = Histogram()
+            hist.observe(duration)
+
+    def snapshot(self, **gauges: int) -> dict[str, Any]:
+        """Return the metrics & the current gauges of the client."""
+        return {
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "waiting": self.waiting,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            **gauges,
+            "connect_time": self.connect_time.snapshot(),
+            "callbacks": {k: v.snapshot() for k, v in list(self.callbacks.items())},
+            "slow_callbacks": dict(self.slow_callbacks),
+            "loop_lag": self.loop_lag.snapshot(),
+        }
+
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def prometheus_text(snapshot: dict[str, Any], prefix: str = "mqtt_entity") -> str:
+    """Format a metrics snapshot in the Prometheus text exposition format."""
+    lines = []
+
+    def histogram(name: str, hist: dict[str, Any], labels: str = "") -> None:
+        sep = "," if labels else ""
+        for bound, cnt in hist["buckets"].items():
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cnt}')
+        lbl = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{lbl} {hist['sum']}")
+        lines.append(f"{name}_count{lbl} {hist['count']}")
+
+    for key, val in snapshot.items():
+        if key == "connect_time":
+            lines.append(f"# TYPE {prefix}_connect_seconds histogram")
+            histogram(f"{prefix}_connect_seconds", val)
+        elif key == "loop_lag":
+            lines.append(f"# TYPE {prefix}_loop_lag_seconds histogram")
+            histogram(f"{prefix}_loop_lag_seconds", val)
+        elif key == "slow_callbacks":
+            lines.append(f"# TYPE {prefix}_slow_callbacks_total counter")
+            lines.extend(
+                f'{prefix}_slow_callbacks_total{{callback="{_label(cbk)}"}} {cnt}'
+                for cbk, cnt in val.items()
+            )
+        elif key == "callbacks":
+            lines.append(f"# TYPE {prefix}_callback_seconds histogram")
+            for cbk, hist in val.items():
+                histogram(
+                    f"{prefix}_callback_seconds", hist, f'callback="{_label(cbk)}"'
+                )
+        elif key in COUNTERS:
+            lines.append(f"# TYPE {prefix}_{key}_total counter")
+            lines.append(f"{prefix}_{key}_total {val}")
+        else:
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {val}")
+    return "\n".join(lines) + "\n"
+
+
+async def serve_prometheus(
+    render: Callable[[], str], host: str = "127.0.0.1", port: int = 9100
+) -> asyncio.Server:
+    """Serve the rendered metrics over HTTP. Close the returned server to stop."""
+
+    async def handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            async with asyncio.timeout(5):
+                request = await reader.readuntil(b"\r\n\r\n")
+            path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+            if path.split(b"?")[0] in (b"/", b"/metrics"):
+                status, body = "200 OK", render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (TimeoutError, ConnectionError, asyncio.IncompleteReadError) as err:
+            _LOG.debug("Metrics: Request failed: %s", err)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    port = server.sockets[0].getsockname()[1]
+    _LOG.info("Metrics: Serving on http://%s:%s/metrics", host, port)
+    return server
+
+
+@dataclass
+class LoopLagProbe:
+    """Measure the event loop scheduling delay from a watchdog thread.
+
+    Every interval a callback is scheduled on the loop, the lag is the time until
+    it runs. A blocked loop is reported while it is still blocked.
+    """
+
+    loop: asyncio.AbstractEventLoop
+    lag: Histogram
+    interval: float = 1.0
+    threshold: float = 0.1
+    """Warn when the loop does not run a callback within this time (seconds)."""
+    check: Callable[[], None] | None = None
+    """Called from the watchdog thread every interval, also while blocked."""
+
+    _stop: threading.Event = field(default_factory=threading.Event, repr=False)
+    _thread: threading.Thread | None = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        """Return True if the watchdog thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the watchdog thread."""
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="mqtt-entity-loop-lag", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the watchdog thread, without waiting for it."""
+        self._stop.set()
+        self._thread = None
+
+    def _run(self) -> None:
+        """Probe the loop until stopped or closed."""
+        stop = self._stop
+        while not stop.wait(self.interval):
+            if self.check:
+                self.check()
+            lag = self._measure(stop)
+            if lag is None:
+                return
+            self.lag.observe(lag)
+
+    def _measure(self, stop: threading.Event) -> float | None:
+        """Return the lag of a callback scheduled on the loop. None if stopped."""
+        ran = threading.Event()
+        ran_at = list[float]()
+
+        def mark() -> None:
+            ran_at.append(time.perf_counter())
+            ran.set()
+
+        sent = time.perf_counter()
+        try:
+            self.loop.call_soon_threadsafe(mark)
+        except RuntimeError:
+            return None  # loop closed
+        if ran.wait(self.threshold):
+            return ran_at[0] - sent
+
+        _LOG.warning(
+            "Event loop blocked for more than %ss, async callbacks & "
+            "publishes are delayed",
+            self.threshold,
+        )
+        while not ran.wait(self.interval):
+            if stop.is_set() or self.loop.is_closed():
+                return None
+            if self.check:
+                self.check()
+        _LOG.warning("Event loop was blocked for %.3fs", ran_at[0] - sent)
+        return ran_at[0] - sent
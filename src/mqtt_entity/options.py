@@ -4,21 +4,17 @@ import logging
 import os
 from collections.abc import Callable
 from dataclasses import Field, dataclass, fields, is_dataclass
+from functools import cache
 from json import load, loads
 from json.decoder import JSONDecodeError
 from pathlib import Path
-from typing import Any, cast, get_origin
-
-from cattrs import Converter, transform_error
-from cattrs.gen import make_dict_structure_fn
+from typing import TYPE_CHECKING, Any, cast, get_origin
 
 from . import supervisor
 from .utils import logging_color
 
-try:
-    from yaml import safe_load
-except ImportError:
-    safe_load = None  # type: ignore[assignment]
+if TYPE_CHECKING:
+    from cattrs import Converter
 
 
 _LOG = logging.getLogger(__name__)
@@ -32,9 +28,11 @@ class AddonOptions:
         self, value: dict, log_lvl: int = logging.DEBUG, log_msg: str = ""
     ) -> None:
         """Structure and copy result to self."""
+        from cattrs import transform_error  # noqa: PLC0415
+
         try:
             _LOG.log(log_lvl, "%s: %s", log_msg or "Loading config", value)
-            val = CONVERTER.structure(value, self.__class__)
+            val = converter().structure(value, self.__class__)
         except Exception as exc:
             msg = "Error loading config: " + "\n".join(transform_error(exc))
             _LOG.error(msg)
@@ -78,6 +76,12 @@ class AddonOptions:
             ".data/options.yaml",  # Pytest
         )
         cfg_files = [f for f in (Path(s) for s in cfg_names) if f.exists()]
+        safe_load = None
+        if any(f.suffix in (".yml", ".yaml") for f in cfg_files):
+            try:
+                from yaml import safe_load  # noqa: PLC0415
+            except ImportError:
+                pass
         if not cfg_files and not env_ok:
             _LOG.error("No config file or environment variables found.")
             os._exit(1)
@@ -147,22 +151,34 @@ class MQTTOptions(AddonOptions):
             _LOG.warning("%s: %s %s", MQFAIL, err, data)
 
 
-CONVERTER = Converter(forbid_extra_keys=True)
+@cache
+def converter() -> "Converter":
+    """Return the cattrs converter. cattrs is imported on first use."""
+    from cattrs import Converter  # noqa: PLC0415
+    from cattrs.gen import make_dict_structure_fn  # noqa: PLC0415
+
+    conv = Converter(forbid_extra_keys=True)
 
+    def structure_ensure_lowercase_keys(cls: type) -> Callable[[Any, Any], Any]:
+        """Convert any uppercase keys to lowercase."""
+        struct = make_dict_structure_fn(cls, conv)  # type: ignore[var-annotated]
 
-def structure_ensure_lowercase_keys(cls: type) -> Callable[[Any, Any], Any]:
-    """Convert any uppercase keys to lowercase."""
-    struct = make_dict_structure_fn(cls, CONVERTER)  # type: ignore[var-annotated]
+        def structure(d: dict[str, Any], cl: Any) -> Any:
+            lower = [k for k in d if k.lower() != k]
+            for k in lower:
+                if k.lower() in d:
+                    _LOG.warning("Key %s already exists in lowercase", k.lower())
+                d[k.lower()] = d.pop(k)
+            return struct(d, cl)
 
-    def structure(d: dict[str, Any], cl: Any) -> Any:
-        lower = [k for k in d if k.lower() != k]
-        for k in lower:
-            if k.lower() in d:
-                _LOG.warning("Key %s already exists in lowercase", k.lower())
-            d[k.lower()] = d.pop(k)
-        return struct(d, cl)
+        return structure
 
-    return structure
+    conv.register_structure_hook_factory(is_dataclass, structure_ensure_lowercase_keys)
+    return conv
 
 
-CONVERTER.register_structure_hook_factory(is_dataclass, structure_ensure_lowercase_keys)
+def __getattr__(name: str) -> Any:
+    """Create CONVERTER on first access."""
+    if name == "CONVERTER":
+        return converter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,8 +6,6 @@ import os
 from typing import Any
 from urllib.parse import urljoin
 
-from aiohttp import ClientSession
-
 _LOG = logging.getLogger(__name__)
 
 MQFAIL = "Supervisor: Failed to get service details from the Supervisor"
@@ -31,6 +29,8 @@ def token(warn: bool = True, fail: bool = False) -> str | None:
 
 async def get(url: str, log_only: bool = True) -> dict[str, Any] | None:
     """Get json data from the HA Supervisor."""
+    from aiohttp import ClientSession  # noqa: PLC0415, only needed with the Supervisor
+
     url = urljoin("http://supervisor", url)
     head = {
         "Authorization": f"Bearer {token(fail=True)}",
@@ -54,6 +54,23 @@ def slug(name: str) -> str:
     return name.lower().replace(" ", "_").replace("-", "_")
 
 
+def tofloat(val: Any, precision: int = 0) -> float | None:
+    """Convert a numeric value to a float, rounded to precision or 3 decimal places.
+
+    Return None if the value is not numeric (or a bool).
+    """
+    if isinstance(val, bool):
+        return None
+    if isinstance(val, str):
+        try:
+            val = float(val)
+        except ValueError:
+            return None
+    if not isinstance(val, int | float):
+        return None
+    return round(val, precision or 3)
+
+
 def tostr(val: Any) -> str:
     """Convert a value to a string with maximum 3 decimal places."""
     if isinstance(val, str):
@@ -1,9 +1,12 @@
 """pytest configuration for the tests."""
 
+from collections.abc import AsyncGenerator
 from typing import Any
 
 import pytest
 
+from mqtt_entity.broker import MQTTBroker
+
 #
 # Pytest Mark: https://stackoverflow.com/a/61193490
 #
@@ -33,3 +36,10 @@ def pytest_collection_modifyitems(config: Any, items: Any) -> None:
             for item in items:
                 if mrk in item.keywords:
                     item.add_marker(skip_mrk)
+
+
+@pytest.fixture
+async def broker() -> AsyncGenerator[MQTTBroker]:
+    """Run an in-process broker on a free port."""
+    async with MQTTBroker() as brk:
+        yield brk
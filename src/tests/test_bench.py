@@ -0,0 +1,26 @@
+"""Test the load generator."""
+
+import json
+from pathlib import Path
+
+from mqtt_entity.bench import Latency, main
+
+
+def test_latency() -> None:
+    """Test the percentiles."""
+    lat = Latency(samples=[i / 1000 for i in range(1, 101)])
+    assert lat.summary() == {"count": 100, "p50": 50, "p90": 90, "p99": 99, "max": 100}
+    assert Latency().summary() == {"count": 0}
+
+
+def test_main(tmp_path: Path) -> None:
+    """Test a short run against the in-process broker."""
+    out = tmp_path / "bench.json"
+    args = "--local --devices 2 --entities 4 --rate 200 --command-rate 20"
+    assert main([*args.split(), "--duration", "0.3", "--json", str(out)]) == 0
+    res = json.loads(out.read_text())
+    assert res["config"]["devices"] == 2
+    assert res["lost"] == {"states": 0, "commands": 0}
+    assert res["latency"]["discovery"]["count"] == 2
+    for name in ("publish", "command", "round_trip"):
+        assert res["latency"][name]["count"] > 0, name
@@ -0,0 +1,223 @@
+"""Test the in-process MQTT broker."""
+
+import asyncio
+import struct
+from collections.abc import Callable
+from json import loads
+
+import pytest
+
+from mqtt_entity import MQTTBaseEntity, MQTTClient, MQTTDevice, MQTTSensorEntity
+from mqtt_entity.broker import (
+    CONNACK_BAD_PROTOCOL,
+    MQTTBroker,
+    topic_matches,
+    valid_filter,
+)
+from mqtt_entity.client import MQTTAsyncClient
+
+
+async def until(cond: Callable[[], bool], limit: float = 3) -> None:
+    """Wait until the condition is true, set by paho's thread or the broker."""
+    async with asyncio.timeout(limit):
+        while not cond():  # noqa: ASYNC110
+            await asyncio.sleep(0.01)
+
+
+async def connect(broker: MQTTBroker, mqc: MQTTAsyncClient) -> None:
+    """Connect the client to the broker."""
+    await mqc.connect(host=broker.host, port=broker.port, wait_connected=True)
+
+
+def test_topic_matches() -> None:
+    """Test wildcard matching."""
+    assert topic_matches("a/b", "a/b")
+    assert topic_matches("a/+/c", "a/b/c")
+    assert topic_matches("a/#", "a")
+    assert topic_matches("a/#", "a/b/c")
+    assert topic_matches("#", "a/b")
+    assert topic_matches("+/+", "/b")
+    assert not topic_matches("a/+", "a/b/c")
+    assert not topic_matches("a/b/c", "a/b")
+    assert not topic_matches("#", "$SYS/broker")
+    assert topic_matches("$SYS/#", "$SYS/broker")
+
+    assert valid_filter("a/+/#")
+    assert not valid_filter("a/#/b")
+    assert not valid_filter("a/b+")
+    assert not valid_filter("")
+
+
+@pytest.mark.parametrize("native_loop", [False, True])
+async def test_client(broker: MQTTBroker, native_loop: bool) -> None:
+    """Test retained messages, wildcards, QoS acks & the last will."""
+    pub = MQTTAsyncClient(
+        availability_topic="pub/status", native_loop=native_loop, track_delivery=True
+    )
+    sub = MQTTAsyncClient(native_loop=native_loop)
+    await connect(broker, pub)
+    await until(lambda: "pub/status" in broker.retained)
+    (pub_id,) = broker.clients
+    await connect(broker, sub)
+
+    for qos in (0, 1, 2):
+        fut = await pub.publish(f"dev/s{qos}/state", str(qos), qos=qos, retain=True)
+        assert fut
+        await asyncio.wait_for(fut, 2)
+
+    received = list[tuple[str, str]]()
+    sub.topic_subscribe("dev/+/state", lambda p, t: received.append((t, p)))
+    sub.topic_subscribe("pub/status", lambda p, t: received.append((t, p)))
+    await until(lambda: len(received) == 4)
+    assert sorted(received) == [
+        ("dev/s0/state", "0"),
+        ("dev/s1/state", "1"),
+        ("dev/s2/state", "2"),
+        ("pub/status", "online"),
+    ]
+
+    retained = await sub.scan_retained("dev/#", max_time=2)
+    assert retained == {f"dev/s{q}/state": str(q).encode() for q in range(3)}
+
+    received.clear()
+    await pub.publish("dev/s1/state", "", retain=True)  # clear retained
+    await until(lambda: len(received) == 1)
+    assert "dev/s1/state" not in broker.retained
+
+    # Connection lost, the broker publishes the will
+    broker.drop(pub_id)
+    await until(lambda: ("pub/status", "offline") in received)
+    # paho reconnects & publishes online
+    await until(lambda: ("pub/status", "online") in received[2:])
+    assert broker.retained["pub/status"][0] == b"online"
+
+    await pub.disconnect()
+    await sub.disconnect()
+    assert broker.messages_in >= 6
+
+
+async def test_scan_retained_subscribed(broker: MQTTBroker) -> None:
+    """Test scans keep topic callbacks & overlapping scans."""
+    for idx in range(2):
+        broker.publish(f"dev/{idx}", str(idx).encode(), retain=True)
+    mqc = MQTTAsyncClient()
+    await connect(broker, mqc)
+    received = list[str]()
+    mqc.topic_subscribe("dev/#", lambda p, t: received.append(p))
+    await until(lambda: len(received) >= 2)
+
+    expected = {"dev/0": b"0", "dev/1": b"1"}
+    res = await asyncio.gather(
+        mqc.scan_retained("dev/#", max_time=2),
+        mqc.scan_retained("dev/+", "other/#", max_time=2),
+    )
+    assert res == [expected, expected]
+    (session,) = broker._sessions.values()
+    await until(lambda: set(session.subscriptions) == {"dev/#"})
+
+    broker.publish("dev/2", b"2")
+    await until(lambda: "2" in received)
+    await mqc.disconnect()
+
+
+async def test_discovery_offline(broker: MQTTBroker) -> None:
+    """Test discovery & the entity cleanup end to end."""
+    broker.retained["homeassistant/sensor/dev/s2/config"] = (b'{"unique_id":"s2"}', 0)
+    sensor = MQTTSensorEntity(name="S1", unique_id="s1", state_topic="dev/s1")
+    dev = MQTTDevice(identifiers=["dev"], components={"s1": sensor})
+    mqc = MQTTClient(devs=[dev], availability_topic="dev/status", clean_entities=2)
+    mqc.retain_discovery = True
+    await connect(broker, mqc)
+
+    await mqc.publish_discovery_info()
+    await until(lambda: "homeassistant/device/dev/config" in broker.retained)
+    assert "homeassistant/sensor/dev/s2/config" not in broker.retained
+    count = broker.messages_in
+
+    # unchanged retained discovery is not published again
+    await mqc.publish_discovery_info()
+    assert broker.messages_in == count + 1  # the retained scan sentinel
+    await mqc.disconnect()
+
+
+async def test_discovery_split_restart(broker: MQTTBroker) -> None:
+    """Test a split device keeps its layout when the client restarts."""
+
+    def make_client(count: int, skip: tuple[int, ...] = ()) -> MQTTClient:
+        cmps: dict[str, MQTTBaseEntity] = {
+            f"s{i}": MQTTSensorEntity(name=f"s{i}", unique_id=f"s{i}", state_topic="s")
+            for i in range(count)
+            if i not in skip
+        }
+        dev = MQTTDevice(identifiers=["dev"], components=cmps)
+        return MQTTClient(
+            devs=[dev],
+            clean_entities=0,
+            retain_discovery=True,
+            discovery_max_bytes=1000,
+        )
+
+    def layout() -> dict[str, str]:
+        res = {}
+        for topic, (payload, _) in broker.retained.items():
+            for key, cmp in loads(payload).get("cmps", {}).items():
+                assert key not in res or cmp == {"p": "sensor"}
+                res.setdefault(key, topic)
+        return res
+
+    mqc = make_client(20)
+    await connect(broker, mqc)
+    await mqc.publish_discovery_info()
+    await until(lambda: "homeassistant/device/dev_1/config" in broker.retained)
+    where = layout()
+    await mqc.disconnect()
+
+    # restart without s3 & s4
+    mqc = make_client(20, skip=(3, 4))
+    await connect(broker, mqc)
+    await mqc.publish_discovery_info()
+    await until(lambda: b'"s3": {"p": "sensor"}' in broker.retained[where["s3"]][0])
+    assert layout() == where
+    assert b'"s4": {"p": "sensor"}' in broker.retained[where["s4"]][0]
+    await mqc.disconnect()
+
+    # restart with a single part, the other parts are cleared
+    mqc = make_client(2)
+    await connect(broker, mqc)
+    await mqc.publish_discovery_info()
+    await until(lambda: "homeassistant/device/dev_1/config" not in broker.retained)
+    assert set(layout().values()) == {"homeassistant/device/dev/config"}
+    await mqc.disconnect()
+
+
+async def test_protocol_errors(broker: MQTTBroker) -> None:
+    """Test unsupported protocols & invalid packets close the connection."""
+    reader, writer = await asyncio.open_connection(broker.host, broker.port)
+    body = struct.pack("!H", 4) + b"MQTT" + bytes([5, 2]) + struct.pack("!HH", 60, 0)
+    writer.write(bytes([0x10, len(body)]) + body)
+    assert await reader.read() == bytes([0x20, 2, 0, CONNACK_BAD_PROTOCOL])
+    writer.close()
+
+    reader, writer = await asyncio.open_connection(broker.host, broker.port)
+    writer.write(bytes([0xC0, 0]))  # PINGREQ before CONNECT
+    assert await reader.read() == b""
+    writer.close()
+    assert not broker.clients
+
+
+async def test_native_loop_drop(broker: MQTTBroker) -> None:
+    """Test a dropped connection while writing leaves the event loop clean."""
+    loop = asyncio.get_running_loop()
+    errors = list[dict]()
+    loop.set_exception_handler(lambda _, ctx: errors.append(ctx))
+    try:
+        mqc = MQTTAsyncClient(native_loop=True)
+        await connect(broker, mqc)
+        payload = b"x" * 65536
+        await mqc.publish_many((f"big/{i}", payload, 0, False) for i in range(200))
+        broker.drop(broker.clients[0])
+        await until(lambda: mqc.metrics["reconnects"] == 1, limit=5)
+        await mqc.disconnect()
+    finally:
+        loop.set_exception_handler(None)
+    assert errors == []
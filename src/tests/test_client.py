@@ -1,22 +1,67 @@
 """Test MQTT class."""
 
 import asyncio
+import contextlib
+import gc
 import logging
+import socket
+import threading
 import time
 from os import getenv
-from unittest.mock import MagicMock, Mock, call, patch
+from typing import Any
+from unittest.mock import ANY, MagicMock, Mock, call, patch
 
 import pytest
-from paho.mqtt.client import Client
+from paho.mqtt.client import (
+    MQTT_ERR_NO_CONN,
+    MQTT_ERR_SUCCESS,
+    Client,
+    MQTTMessage,
+    topic_matches_sub,
+)
 from paho.mqtt.enums import CallbackAPIVersion
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from paho.mqtt.reasoncodes import ReasonCode
 
 from mqtt_entity import MQTTClient, MQTTDevice, MQTTSelectEntity, MQTTSensorEntity
-from mqtt_entity.client import HA_STATUS_TOPIC, MQTTMatcher2
+from mqtt_entity.client import HA_STATUS_TOPIC, MQTTMatcher2, TopicHandler
+from mqtt_entity.device import MQTTOrigin
 from mqtt_entity.options import MQTTOptions
 
 _LOG = logging.getLogger(__name__)
 
 
+def fake_broker(mqc: MQTTClient, cmock: MagicMock, retained: dict[str, str]) -> None:
+    """Deliver retained messages on subscribe & subscribed messages on publish."""
+
+    def deliver(topic: str, payload: bytes) -> None:
+        msg = MQTTMessage(topic=topic.encode())
+        msg.payload = payload
+        mqc._mqtt_on_message(cmock, None, msg)
+
+    def subscribe(sub: str) -> None:
+        for topic, payload in list(retained.items()):
+            if topic_matches_sub(sub, topic):
+                deliver(topic, payload.encode())
+
+    def publish(
+        topic: str, payload: Any = None, qos: int = 0, retain: bool = False
+    ) -> MagicMock:
+        if retain and payload:
+            retained[topic] = payload
+        elif retain:
+            retained.pop(topic, None)
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if list(mqc._on_message_filtered.match(topic)):
+            deliver(topic, payload or b"")
+        return MagicMock(rc=MQTT_ERR_SUCCESS, mid=0)
+
+    cmock.subscribe.side_effect = subscribe
+    cmock.publish.side_effect = publish
+
+
 @pytest.mark.asyncio
 @pytest.mark.mqtt
 async def test_mqtt_server() -> None:
@@ -108,19 +153,12 @@ async def test_connect(caplog: pytest.LogCaptureFixture) -> None:
         )
         mqc = MQTTClient(availability_topic="test/status")
 
-        ok_seconds = time.time() + 0.3
-
-        def is_connected() -> bool:
-            """Return if the client is connected."""
-            nonlocal ok_seconds
-            if time.time() < ok_seconds:
-                return False
-            if ok_seconds:
-                mqc._mqtt_on_connect(cmock, None, None, 0)  # type:ignore[arg-type]
-                ok_seconds = 0
-            return True
+        cmock.is_connected.return_value = False
 
-        cmock.is_connected.side_effect = is_connected
+        def connected() -> None:
+            """Paho connected."""
+            cmock.is_connected.return_value = True
+            mqc._mqtt_on_connect(cmock, None, None, 0)  # type:ignore[arg-type]
 
         # ensure client was enabled
         assert isinstance(mqc.client, Mock), "mock is not in place"
@@ -130,6 +168,7 @@ async def test_connect(caplog: pytest.LogCaptureFixture) -> None:
         assert not cmock.is_connected()
 
         await mqc.connect(MQTTOptions(mqtt_username="me", mqtt_password="secret"))
+        asyncio.get_running_loop().call_later(0.3, connected)
 
         assert cmock.is_connected.called
         assert cmock.loop_start.call_count == 1
@@ -166,8 +205,10 @@ async def test_connect(caplog: pytest.LogCaptureFixture) -> None:
             )
         ]
 
+        fake_broker(mqc, cmock, {})
         await mqc.publish_discovery_info()
-        assert cmock.publish.call_count == 2
+        # the retained scan sentinel & the discovery info
+        assert cmock.publish.call_count == 3
 
 
 def test_mqttmatcher() -> None:
@@ -186,6 +227,60 @@ def test_mqttmatcher() -> None:
     assert "test/789" not in m
 
 
+def test_mqttmatcher_wildcards() -> None:
+    """Test the literal index & wildcard match cache."""
+    m = MQTTMatcher2()
+    m["test/123"] = "a"
+    assert m.match("test/123") == ("a",)
+    assert m["test/123"] == "a"
+    assert not m._cache
+
+    m["test/+"] = "w"
+    assert m.match("test/123") == ("a", "w")
+    assert m.match("test/456") == ("w",)
+    assert m.match("other/456") == ()
+    assert set(m._cache) == {"test/123", "test/456"}
+
+    m["#"] = "all"  # invalidates the cache
+    assert not m._cache
+    assert m.match("other/456") == ("all",)
+    assert m.match("$SYS/x") == ()
+
+    m.pop("test/+")
+    m.pop("#")
+    m.pop("does/not/exist")
+    assert m.match("test/456") == ()
+    assert m.match("test/123") == ("a",)
+    assert list(m.keys()) == ["test/123"]
+
+    m.pop("test/123")
+    assert "test/123" not in m
+    with pytest.raises(KeyError):
+        m["test/123"]
+
+    m.cache_size = 2
+    m["test/+"] = "w"
+    for topic in ("test/1", "test/2", "test/3"):
+        assert m.match(topic) == ("w",)
+    assert len(m._cache) <= 2
+
+
+def test_mqttmatcher_cache_race() -> None:
+    """Test a filter added while paho's thread stores a match is not lost."""
+    m = MQTTMatcher2()
+    m["test/+"] = "w"
+
+    class RacyCache(dict):
+        def __setitem__(self, topic: str, value: Any) -> None:
+            if "test/#" not in m._wildcard_keys:
+                m["test/#"] = "all"  # by the event loop, before the store
+            super().__setitem__(topic, value)
+
+    m._cache = RacyCache()
+    assert m.match("test/1") == ("w",)
+    assert set(m.match("test/1")) == {"all", "w"}
+
+
 @pytest.mark.asyncio
 async def test_reconnect_after_broker_restart(caplog: pytest.LogCaptureFixture) -> None:
     """Test that wait_connected() survives a broker restart.
@@ -208,17 +303,16 @@ async def test_reconnect_after_broker_restart(caplog: pytest.LogCaptureFixture)
 
         # Phase 2: broker goes down — simulate stale connect_time
         cmock.is_connected.return_value = False
+        mqc._mqtt_on_disconnect(cmock, None, None, 7)  # type: ignore[arg-type]
+        await asyncio.sleep(0)
         mqc.connect_time = time.time() - 100  # deadline long expired
 
         # Phase 3: paho auto-reconnect will restore in 0.3s
-        reconnect_at = time.time() + 0.3
+        def reconnect() -> None:
+            cmock.is_connected.return_value = True
+            mqc._mqtt_on_connect(cmock, None, None, 0)  # type: ignore[arg-type]
 
-        def delayed_reconnect() -> bool:
-            if time.time() >= reconnect_at:
-                return True
-            return False
-
-        cmock.is_connected.side_effect = delayed_reconnect
+        asyncio.get_running_loop().call_later(0.3, reconnect)
 
         # wait_connected() should detect stale deadline, grant fresh window,
         # and wait for auto-reconnect instead of failing immediately
@@ -283,7 +377,610 @@ async def test_ha_status_topic(caplog: pytest.LogCaptureFixture) -> None:
         assert HA_STATUS_TOPIC in mqc._on_message_filtered
 
         assert "MQTT: Home Assistant online" not in caplog.text
-        await mqc._on_message_filtered[HA_STATUS_TOPIC]("online", "")
+        await mqc._on_message_filtered[HA_STATUS_TOPIC].callback("online", "")
         assert "MQTT: Home Assistant online" in caplog.text
         await asyncio.sleep(0.1)
         assert "Timeout waiting for Home Assistant" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_publish_many() -> None:
+    """Test publishing a batch of messages."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient()
+        cmock.is_connected.return_value = True
+        mqc.connect_time = 1
+
+        await mqc.publish_many([])
+        assert cmock.publish.call_count == 0
+
+        await mqc.publish_many(
+            [("test/a", "1", 0, False), ("test/b", None, 0, True)],
+        )
+        assert cmock.publish.call_args_list == [
+            call("test/a", "1", 0, False),
+            call("test/b", None, 1, True),
+        ]
+
+        with pytest.raises(ValueError):
+            await mqc.publish_many([("", "1", 0, False)])
+
+
+@pytest.mark.asyncio
+async def test_write_behind() -> None:
+    """Test buffered publishes are coalesced per topic & flushed."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.is_connected.return_value = False
+        mqc = MQTTClient(write_behind=0.02)
+        ent = MQTTSensorEntity(name="p", unique_id="p", state_topic="test/p")
+
+        # buffered before connecting, never waits for the connection
+        for val in range(100):
+            await ent.send_state(mqc, val)
+        await mqc.publish("test/a", "1", buffered=True)
+        await asyncio.sleep(0.05)
+        assert cmock.publish.call_count == 0
+        assert len(mqc._buffer) == 2
+
+        cmock.is_connected.return_value = True
+        mqc.connect_time = 1
+        await asyncio.sleep(0.05)
+        assert cmock.publish.call_args_list == [
+            call("test/p", "99", 0, False),
+            call("test/a", "1", 0, False),
+        ]
+        assert mqc._flush_task is None
+
+        # unbuffered publish is immediate
+        await mqc.publish("test/b", "2")
+        assert cmock.publish.call_count == 3
+
+        # flush on disconnect
+        await mqc.publish("test/a", "3", buffered=True)
+        mqc._connected.set()
+        await mqc.disconnect()
+        assert cmock.publish.call_args == call("test/a", "3", 0, False)
+        assert not mqc._buffer
+
+
+@pytest.mark.asyncio
+async def test_flush_cancelled() -> None:
+    """Test a flush cancelled while waiting for a reconnect keeps the buffer."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.is_connected.return_value = False
+        mqc = MQTTClient(write_behind=0.01)
+        mqc.connect_time = time.time() + 5  # connection lost, waiting
+        await mqc.publish("test/a", "1", buffered=True)
+        await asyncio.sleep(0.05)
+        assert mqc._flush_task
+        assert mqc._metrics.waiting == 1
+
+        await mqc.disconnect()  # cancels the flush
+        assert mqc._buffer == {"test/a": ("test/a", "1", 0, False)}
+        assert cmock.publish.call_count == 0
+
+        # published once connected
+        cmock.is_connected.return_value = True
+        await mqc.flush()
+        assert cmock.publish.call_args_list == [call("test/a", "1", 0, False)]
+        assert not mqc._buffer
+
+
+@pytest.mark.asyncio
+async def test_flush_refused(caplog: pytest.LogCaptureFixture) -> None:
+    """Test the flush stops while the connection is refused."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.is_connected.return_value = False
+        cmock.publish.return_value = MagicMock(rc=MQTT_ERR_SUCCESS, mid=0)
+        mqc = MQTTClient(write_behind=0.01)
+        await mqc.connect()
+        await mqc.publish("test/a", "0", buffered=True)
+        assert mqc._flush_task
+        refused = ReasonCode(PacketTypes.CONNACK, "Not authorized")
+        mqc._mqtt_on_connect(cmock, None, None, refused)
+
+        for val in range(1, 10):
+            await mqc.publish("test/a", str(val), buffered=True)
+            await asyncio.sleep(0.01)
+        assert mqc._flush_task is None
+        assert caplog.text.count("Flush failed") == 0
+        assert caplog.text.count("buffered until connected") == 1
+
+        # restarted once connected
+        cmock.is_connected.return_value = True
+        mqc._mqtt_on_connect(cmock, None, None, ReasonCode(PacketTypes.CONNACK))
+        await asyncio.sleep(0.05)
+        assert cmock.publish.call_args_list == [call("test/a", "9", 0, False)]
+        assert not mqc._buffer
+        await mqc.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_retain_discovery() -> None:
+    """Test devices with an unchanged retained config are not published."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient(clean_entities=0, retain_discovery=True)
+        await mqc.connect()
+        mqc.devs = [
+            MQTTDevice(identifiers=[f"dev{i}"], components={}) for i in range(3)
+        ]
+        origin = MQTTOrigin(name=mqc.origin_name, sw=mqc.origin_version)
+        retained = {
+            "homeassistant/device/dev0/config": mqc.devs[0].discovery_payload(
+                "", origin=origin
+            )[1],
+            "homeassistant/device/dev1/config": "{}",
+        }
+
+        fake_broker(mqc, cmock, retained)
+        start = time.perf_counter()
+        await mqc.publish_discovery_info()
+        assert time.perf_counter() - start < 0.1  # dev2 has no retained config
+        published = [c.args for c in cmock.publish.call_args_list]
+        assert published[0][0].startswith("mqtt-entity/scan/")
+        assert [p[0] for p in published[1:]] == [
+            "homeassistant/device/dev1/config",
+            "homeassistant/device/dev2/config",
+        ]
+        assert all(p[3] for p in published[1:])  # retain
+        assert "homeassistant/device/dev0/config" not in mqc._on_message_filtered
+
+
+@pytest.mark.asyncio
+async def test_clean_entities() -> None:
+    """Test entity based discovery is migrated or removed without fixed delays."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        old = {
+            "homeassistant/sensor/dev/s1/config": '{"unique_id": "s1"}',
+            "homeassistant/sensor/dev/s2/config": '{"migrate_discovery": true}',
+            "homeassistant/sensor/other/s3/config": '{"unique_id": "s3"}',
+        }
+        sensor = MQTTSensorEntity(name="S1", unique_id="s1", state_topic="dev/s1")
+        dev = MQTTDevice(identifiers=["dev"], components={"s1": sensor})
+
+        mqc = MQTTClient(devs=[dev])
+        await mqc.connect()
+        retained = dict(old)
+        fake_broker(mqc, cmock, retained)
+        start = time.perf_counter()
+        await mqc.publish_discovery_info()
+        assert time.perf_counter() - start < 0.5
+        assert mqc.clean_entities == 0
+        published = [c.args[:2] for c in cmock.publish.call_args_list]
+        assert published[0][0].startswith("mqtt-entity/scan/")
+        assert published[1:] == [
+            ("homeassistant/sensor/dev/s1/config", '{"migrate_discovery": true}'),
+            ("homeassistant/device/dev/config", ANY),
+            ("homeassistant/sensor/dev/s1/config", None),
+            ("homeassistant/sensor/dev/s2/config", None),
+        ]
+        assert list(retained) == ["homeassistant/sensor/other/s3/config"]
+
+        # remove entities that are not part of the device
+        retained = dict(old)
+        retained["homeassistant/sensor/dev/s4/config"] = '{"unique_id": "s4"}'
+        mqc = MQTTClient(devs=[dev], clean_entities=2)
+        await mqc.connect()
+        fake_broker(mqc, cmock, retained)
+        cmock.publish.reset_mock()
+        await mqc.publish_discovery_info()
+        published = [c.args[:2] for c in cmock.publish.call_args_list]
+        assert published[1:] == [
+            ("homeassistant/sensor/dev/s4/config", None),
+            ("homeassistant/device/dev/config", ANY),
+        ]
+        assert "homeassistant/sensor/dev/s1/config" in retained
+
+
+@pytest.mark.asyncio
+async def test_discovery_max_packet_size() -> None:
+    """Test discovery is split to fit the broker's maximum packet size."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient(clean_entities=0)
+        await mqc.connect()
+        props = Properties(PacketTypes.CONNACK)
+        props.MaximumPacketSize = 1500
+        mqc._mqtt_on_connect(cmock, None, None, ReasonCode(PacketTypes.CONNACK), props)
+        assert mqc.max_packet_size == 1500
+
+        mqc.devs = [
+            MQTTDevice(
+                identifiers=["dev"],
+                components={
+                    f"s{i}": MQTTSensorEntity(
+                        name=f"s{i}", unique_id=f"s{i}", state_topic=f"dev/s{i}"
+                    )
+                    for i in range(40)
+                },
+            )
+        ]
+        await mqc.publish_discovery_info()
+        sizes = [len(c.args[1]) for c in cmock.publish.call_args_list]
+        assert len(sizes) > 2
+        assert max(sizes) <= 1500 - 256
+
+
+@pytest.mark.asyncio
+async def test_discovery_window() -> None:
+    """Test discovery is built at once & published with a bounded window."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient(
+            clean_entities=0,
+            track_delivery=True,
+            discovery_window=4,
+            discovery_in_executor=True,
+        )
+        await mqc.connect()
+        mqc.devs = [MQTTDevice(identifiers=[f"d{i}"], components={}) for i in range(20)]
+        ok = ReasonCode(PacketTypes.PUBACK, "Success")
+        max_pending = 0
+
+        def publish(*_: Any) -> MagicMock:
+            nonlocal max_pending
+            mid = cmock.publish.call_count
+            max_pending = max(max_pending, len(mqc._pending_delivery) + 1)
+            # the broker acks after a round-trip
+            asyncio.get_running_loop().call_later(0.001, mqc._delivered, mid, ok)
+            return MagicMock(rc=MQTT_ERR_SUCCESS, mid=mid)
+
+        cmock.publish.side_effect = publish
+        await mqc.publish_discovery_info()
+        assert cmock.publish.call_count == 20
+        assert max_pending == 4
+        assert not mqc._pending_delivery
+
+
+@pytest.mark.asyncio
+async def test_track_delivery(caplog: pytest.LogCaptureFixture) -> None:
+    """Test delivery futures."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient(track_delivery=True)
+        assert cmock.on_publish == mqc._mqtt_on_publish
+        cmock.is_connected.return_value = True
+        await mqc.connect()
+
+        cmock.publish.return_value = MagicMock(rc=MQTT_ERR_SUCCESS, mid=1)
+        fut = await mqc.publish("test/a", "1", qos=1)
+        assert fut is not None and not fut.done()
+        assert mqc._pending_delivery == {1: fut}
+
+        ok = ReasonCode(PacketTypes.PUBACK, "Success")
+        mqc._mqtt_on_publish(cmock, None, 1, ok)
+        await asyncio.wait_for(fut, 1)
+        assert not mqc._pending_delivery
+
+        # QoS 1 messages are queued while disconnected, QoS 0 fail
+        cmock.publish.return_value = MagicMock(rc=MQTT_ERR_NO_CONN, mid=2)
+        futs = await mqc.publish_many(
+            [("test/a", "1", 1, False), ("test/b", "1", 0, False)]
+        )
+        assert len(futs) == 2
+        assert not futs[0].done()
+        with pytest.raises(ConnectionError):
+            await futs[1]
+
+        # internal publishes discard the future, failures are still retrieved
+        ent = MQTTSensorEntity(name="s", unique_id="s", state_topic="test/s")
+        with caplog.at_level(logging.DEBUG):
+            await ent.send_state(mqc, 1)
+            await mqc.publish_many([("test/c", "1", 0, False)])
+            await asyncio.sleep(0)
+            gc.collect()
+        assert "test/s not delivered" in caplog.text
+        assert "never retrieved" not in caplog.text
+
+        await mqc.disconnect()
+        assert futs[0].cancelled()
+        assert not mqc._pending_delivery
+
+        mqc.track_delivery = False
+        assert await mqc.publish("test/a", "1") is None
+        assert await mqc.publish_many([("test/a", "1", 0, False)]) == []
+
+
+@pytest.mark.asyncio
+async def test_wait_connected_event() -> None:
+    """Test wait_connected wakes on connect & fails on connection errors."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.is_connected.return_value = False
+        mqc = MQTTClient()
+        assert cmock.on_disconnect == mqc._mqtt_on_disconnect
+
+        with pytest.raises(RuntimeError):
+            await mqc.wait_connected()
+
+        await mqc.connect()
+        waiters = [asyncio.create_task(mqc.wait_connected()) for _ in range(50)]
+        await asyncio.sleep(0.01)
+        assert not any(w.done() for w in waiters)
+
+        start = time.perf_counter()
+        mqc._mqtt_on_connect(cmock, None, None, 0)  # type: ignore[arg-type]
+        await asyncio.gather(*waiters)
+        assert time.perf_counter() - start < 0.05
+
+        mqc._mqtt_on_disconnect(cmock, None, None, 7)  # type: ignore[arg-type]
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(mqc.wait_connected())
+        await asyncio.sleep(0.01)
+        mqc._mqtt_on_connect(cmock, None, None, 5)  # type: ignore[arg-type]
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(waiter, 0.05)
+
+
+@pytest.mark.asyncio
+async def test_on_message_dispatch() -> None:
+    """Test callbacks are analysed once & dispatched with the right arguments."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient()
+        await mqc.connect()
+        calls = list[tuple[str, ...]]()
+
+        def on_payload(payload: str) -> None:
+            calls.append(("sync", payload))
+
+        async def on_topic(payload: str, topic: str) -> None:
+            calls.append(("async", payload, topic))
+
+        mqc.topic_subscribe("test/+/set", on_payload)  # type: ignore[arg-type]
+        mqc.topic_subscribe("test/a/set", on_topic)
+
+        hdl = mqc._on_message_filtered["test/a/set"]
+        assert hdl == TopicHandler(
+            callback=on_topic, name="on_topic", arity=2, is_async=True
+        )
+        assert mqc._on_message_filtered["test/+/set"].arity == 1
+
+        msg = MQTTMessage(topic=b"test/a/set")
+        msg.payload = b"42"
+        with patch("mqtt_entity.client.inspect") as inspect_mock:
+            mqc._mqtt_on_message(cmock, None, msg)
+            assert not inspect_mock.mock_calls
+        assert calls == [("sync", "42")]
+        await asyncio.sleep(0.01)
+        assert calls == [("sync", "42"), ("async", "42", "test/a/set")]
+
+
+@pytest.mark.asyncio
+async def test_on_message_payload_type() -> None:
+    """Test bytes & memoryview callbacks receive the raw payload."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient()
+        await mqc.connect()
+        calls = list[Any]()
+
+        def on_bytes(payload: bytes, topic: str) -> None:
+            calls.append(payload)
+
+        async def on_view(payload: memoryview, topic: str) -> None:
+            calls.append(payload)
+
+        mqc.topic_subscribe("cam/snapshot", on_bytes, payload_type="bytes")
+        mqc.topic_subscribe("cam/+", on_view, payload_type="memoryview")
+        with pytest.raises(ValueError):
+            mqc.topic_subscribe("cam/x", on_bytes, payload_type="int")  # type: ignore[arg-type]
+
+        msg = MQTTMessage(topic=b"cam/snapshot")
+        msg.payload = b"\xff\xd8\xff"  # not utf-8
+        mqc._mqtt_on_message(cmock, None, msg)
+        await asyncio.sleep(0.01)
+        assert calls[0] is msg.payload
+        assert isinstance(calls[1], memoryview)
+        assert calls[1].obj is msg.payload
+
+        cmock.is_connected.return_value = True
+        await mqc.publish("cam/snapshot", msg.payload)
+        cmock.publish.assert_called_with("cam/snapshot", msg.payload, 0, False)
+
+
+@pytest.mark.asyncio
+async def test_on_message_coalesced() -> None:
+    """Test a burst of messages wakes the event loop once."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient()
+        await mqc.connect()
+        received = list[str]()
+        release = asyncio.Event()
+
+        async def on_cmd(payload: str, _: str) -> None:
+            if payload == "slow":
+                await release.wait()
+            received.append(payload)
+
+        mqc.topic_subscribe("test/set", on_cmd)
+
+        def burst() -> None:
+            for payload in (b"1", b"slow", b"2", b"3"):
+                msg = MQTTMessage(topic=b"test/set")
+                msg.payload = payload
+                mqc._mqtt_on_message(cmock, None, msg)
+
+        with patch.object(
+            mqc._loop, "call_soon_threadsafe", wraps=mqc._loop.call_soon_threadsafe
+        ) as wakeup:
+            thread = threading.Thread(target=burst)
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0)
+        assert wakeup.call_count == 1
+        assert received == ["1", "2", "3"]
+        assert len(mqc._tasks) == 1
+
+        release.set()
+        await asyncio.sleep(0.01)
+        assert received == ["1", "2", "3", "slow"]
+        assert not mqc._tasks
+
+
+@pytest.mark.asyncio
+async def test_on_message_loop_replaced() -> None:
+    """Test async callbacks run after a reconnect on a new event loop."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        mqc = MQTTClient()
+        received = list[str]()
+
+        async def on_cmd(payload: str, _: str) -> None:
+            received.append(payload)
+
+        mqc.topic_subscribe("test/set", on_cmd)
+
+        def deliver(payload: bytes) -> None:
+            msg = MQTTMessage(topic=b"test/set")
+            msg.payload = payload
+            mqc._mqtt_on_message(cmock, None, msg)
+
+        async def wait_connected() -> None:
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(0.01):
+                    await mqc._connected.wait()
+
+        for closed in (False, True):
+            # the previous loop never drains: stopped, or closed
+            old = asyncio.new_event_loop()
+            mqc._loop = old
+            if closed:
+                old.close()
+            await asyncio.to_thread(deliver, b"old")
+            assert mqc._inbound_scheduled is not closed
+            old.close()
+            if closed:
+                mqc._connected.set()
+
+            await mqc.connect()
+            assert mqc._connected.is_set() is closed  # state carried over
+            mqc._connected.clear()
+            await asyncio.to_thread(deliver, b"new")
+            await asyncio.sleep(0.01)
+            assert received == ["old", "new"]
+            received.clear()
+
+        async def run_again() -> None:
+            await mqc.connect()
+            await wait_connected()
+
+        # reused by another asyncio.run(), the Event is bound to this loop
+        await wait_connected()
+        await asyncio.to_thread(lambda: asyncio.run(run_again()))
+
+
+@pytest.mark.asyncio
+async def test_native_loop() -> None:
+    """Test paho's network I/O is driven from the event loop."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.is_connected.return_value = True
+        mqc = MQTTClient(native_loop=True)
+        await mqc.connect()
+        await asyncio.sleep(0.05)
+
+        assert cmock.loop_start.call_count == 0
+        assert cmock.reconnect.call_count == 1
+        assert cmock.loop_misc.call_count == 1
+        assert cmock.on_socket_open == mqc._on_socket_open
+
+        sock, peer = socket.socketpair()
+        with sock, peer:
+            mqc._on_socket_open(cmock, None, sock)
+            peer.send(b"x")
+            await asyncio.sleep(0.01)
+            assert cmock.loop_read.call_count >= 1
+
+            mqc._on_socket_register_write(cmock, None, sock)
+            await asyncio.sleep(0.01)
+            assert cmock.loop_write.call_count >= 1
+            mqc._on_socket_unregister_write(cmock, None, sock)
+            await asyncio.sleep(0)
+            cmock.loop_write.reset_mock()
+            await asyncio.sleep(0.01)
+            assert cmock.loop_write.call_count == 0
+
+            # publish without a thread hop
+            with patch("asyncio.to_thread") as to_thread:
+                await mqc.publish("test/a", "1")
+                await mqc.publish_many([("test/b", "2", 0, False)])
+            assert to_thread.call_count == 0
+            assert cmock.publish.call_count == 2
+
+            cmock.socket.return_value = sock
+            await mqc.disconnect()
+            assert mqc._network_task is None
+            cmock.loop_read.reset_mock()
+            peer.send(b"x")
+            await asyncio.sleep(0.01)
+            assert cmock.loop_read.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_native_loop_backoff() -> None:
+    """Test native loop reconnects back off until a connection is accepted."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.socket.return_value = None  # refused or dropped every time
+        mqc = MQTTClient(native_loop=True)
+        sleeps = list[float]()
+        real_sleep = asyncio.sleep
+
+        async def sleep(delay: float) -> None:
+            sleeps.append(delay)
+            await real_sleep(0)
+
+        with patch("mqtt_entity.client.asyncio.sleep", sleep):
+            async with asyncio.timeout(3):
+                await mqc.connect()
+                while len([d for d in sleeps if d != 1]) < 3:
+                    await real_sleep(0.001)
+                assert [d for d in sleeps if d != 1][:3] == [2, 4, 8]
+
+                # accepted, the next reconnect starts at 1s
+                mqc._mqtt_on_connect(cmock, None, None, ReasonCode(PacketTypes.CONNACK))
+                sleeps.clear()
+                while 2 not in sleeps:
+                    await real_sleep(0.001)
+                assert set(sleeps[: sleeps.index(2)]) == {1}
+                await mqc.disconnect()
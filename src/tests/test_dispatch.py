@@ -0,0 +1,184 @@
+"""Test the topic dispatcher."""
+
+import asyncio
+import threading
+from collections.abc import Callable, Coroutine
+from typing import Any
+from unittest.mock import MagicMock, patch
+
+import pytest
+from paho.mqtt.client import Client, MQTTMessage
+from paho.mqtt.enums import CallbackAPIVersion
+from test_broker import connect, until
+
+from mqtt_entity import MQTTClient, TopicDispatcher
+from mqtt_entity.broker import MQTTBroker
+from mqtt_entity.client import MQTTAsyncClient
+
+
+def make_job(
+    log: list[str], name: str, gate: asyncio.Event | None = None
+) -> Callable[[], Coroutine[Any, Any, None]]:
+    """Create a job that waits for the gate & logs its name."""
+
+    async def job() -> None:
+        if gate:
+            await gate.wait()
+        log.append(name)
+
+    return job
+
+
+@pytest.mark.asyncio
+async def test_order_and_concurrency() -> None:
+    """Test messages on a topic are in order & topics run in parallel."""
+    dsp = TopicDispatcher(concurrency=2)
+    log = list[str]()
+    gate = asyncio.Event()
+
+    dsp.submit("a", make_job(log, "a1", gate))
+    dsp.submit("a", make_job(log, "a2"))
+    dsp.submit("b", make_job(log, "b1"))
+    dsp.submit("c", make_job(log, "c1"))
+    assert len(dsp._workers) == 2
+    assert dsp.pending == 4
+
+    await asyncio.sleep(0.01)
+    # a1 blocks topic a, the second worker handles b & c
+    assert log == ["b1", "c1"]
+
+    gate.set()
+    await asyncio.sleep(0.01)
+    assert log == ["b1", "c1", "a1", "a2"]
+    assert not dsp._queues
+    assert not dsp._workers
+
+
+@pytest.mark.asyncio
+async def test_overflow_drop() -> None:
+    """Test the drop policies."""
+    for overflow, expected in (
+        ("drop_oldest", ["1", "3", "4"]),
+        ("drop_newest", ["1", "2", "3"]),
+    ):
+        dsp = TopicDispatcher(concurrency=1, queue_size=2, overflow=overflow)  # type: ignore[arg-type]
+        log = list[str]()
+        gate = asyncio.Event()
+        dsp.submit("a", make_job(log, "1", gate))
+        await asyncio.sleep(0)  # worker picked up 1
+        for name in "234":
+            dsp.submit("a", make_job(log, name))
+        assert dsp.dropped == 1
+        gate.set()
+        await asyncio.sleep(0.01)
+        assert log == expected, overflow
+
+
+@pytest.mark.asyncio
+async def test_overflow_block() -> None:
+    """Test the block policy signals backpressure."""
+    dsp = TopicDispatcher(concurrency=1, queue_size=2, overflow="block")
+    resumed = list[bool]()
+    dsp.on_space = lambda: resumed.append(True)
+    log = list[str]()
+    gate = asyncio.Event()
+
+    dsp.submit("a", make_job(log, "1", gate))
+    dsp.submit("a", make_job(log, "2"))
+    assert not dsp.space.is_set()
+    dsp.submit("a", make_job(log, "3"))  # never dropped
+    assert dsp.dropped == 0
+
+    gate.set()
+    await asyncio.sleep(0.01)
+    assert dsp.space.is_set()
+    assert resumed == [True]
+    assert log == ["1", "2", "3"]
+
+    dsp.submit("a", make_job(log, "4", asyncio.Event()))
+    dsp.submit("a", make_job(log, "5"))
+    assert not dsp.space.is_set()
+    dsp.close()
+    assert dsp.space.is_set()
+    assert dsp.pending == 0
+
+    # paho's thread: the backlog counts messages until a worker starts them
+    dsp.block_timeout = 0.01
+    dsp.wait_space("b")
+    dsp.wait_space("b")
+    assert dsp._backlog == {"b": 2}
+    dsp.wait_space("b")  # times out
+    assert dsp._backlog == {"b": 3}
+    for name in "678":
+        dsp.submit("b", make_job(log, name))
+    await asyncio.sleep(0.01)
+    assert log[-3:] == ["6", "7", "8"]
+    assert not dsp._backlog
+
+    with pytest.raises(ValueError):
+        TopicDispatcher(concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_client_dispatcher() -> None:
+    """Test the client dispatches async callbacks through the dispatcher."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        dsp = TopicDispatcher(concurrency=1)
+        mqc = MQTTClient(dispatcher=dsp)
+        await mqc.connect()
+        active = 0
+        received = list[str]()
+
+        async def on_cmd(payload: str, topic: str) -> None:
+            nonlocal active
+            active += 1
+            assert active == 1
+            await asyncio.sleep(0.001)
+            received.append(payload)
+            active -= 1
+
+        mqc.topic_subscribe("test/+/set", on_cmd)
+
+        def burst() -> None:
+            for idx in range(20):
+                msg = MQTTMessage(topic=f"test/{idx % 2}/set".encode())
+                msg.payload = str(idx).encode()
+                mqc._mqtt_on_message(cmock, None, msg)
+
+        thread = threading.Thread(target=burst)
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0.2)
+        assert sorted(received, key=int) == [str(i) for i in range(20)]
+        assert [r for r in received if int(r) % 2] == [str(i) for i in range(1, 20, 2)]
+        assert not mqc._tasks
+
+
+@pytest.mark.parametrize("native_loop", [False, True])
+async def test_block_bound(broker: MQTTBroker, native_loop: bool) -> None:
+    """Test the block policy bounds the backlog while paho keeps receiving."""
+    dsp = TopicDispatcher(concurrency=1, queue_size=2, overflow="block")
+    sub = MQTTAsyncClient(native_loop=native_loop, dispatcher=dsp)
+    pub = MQTTAsyncClient()
+    received = list[str]()
+    backlog = list[int]()
+
+    async def on_msg(payload: str, topic: str) -> None:
+        backlog.append(dsp.pending + len(sub._inbound))
+        await asyncio.sleep(0.002)
+        received.append(payload)
+
+    await connect(broker, sub)
+    sub.topic_subscribe("load/a", on_msg)
+    await connect(broker, pub)
+    await until(lambda: len(broker.clients) == 2)
+    await asyncio.sleep(0.1)  # subscribed
+    await pub.publish_many(("load/a", str(i), 0, False) for i in range(100))
+    await until(lambda: len(received) == 100, limit=10)
+    assert received == [str(i) for i in range(100)]
+    assert max(backlog) <= dsp.queue_size
+    await sub.disconnect()
+    await pub.disconnect()
@@ -1,5 +1,8 @@
 """Test entities."""
 
+from dataclasses import dataclass
+from json import loads
+from typing import Any
 from unittest.mock import AsyncMock
 
 import pytest
@@ -9,10 +12,13 @@ from mqtt_entity import (
     MQTTDeviceTrigger,
     MQTTEntity,
     MQTTNumberEntity,
+    MQTTSelectEntity,
     MQTTSensorEntity,
 )
 from mqtt_entity.client import MQTTAsyncClient
 from mqtt_entity.device import MQTTOrigin
+from mqtt_entity.entities import MQTTBaseEntity
+from mqtt_entity.helpers import ABBREVIATE, hass_abbreviate
 
 
 def test_ent() -> None:
@@ -165,3 +171,280 @@ async def test_set_attributes() -> None:
     await e.send_json_attributes(mc, thea)
     assert mc.publish.call_count == 1
     assert mc.publish.call_args[1]["topic"] == "blah"
+
+
+@pytest.mark.asyncio
+async def test_state_cache() -> None:
+    """Test unchanged states are not published with state_cache."""
+    ent = MQTTSensorEntity(
+        unique_id="a1", state_topic="/st", name="test1", state_cache=True
+    )
+    assert "state_cache" not in ent.as_discovery_dict
+    mc = AsyncMock(spec=MQTTAsyncClient)
+
+    for val in (1, 1.0, "1", 2, 2):
+        await ent.send_state(mc, val)
+    assert [c.args[1] for c in mc.publish.call_args_list] == ["1", "2"]
+    assert ent.states_suppressed == 3
+
+    await ent.send_state(mc, 2, force=True)
+    ent.clear_state_cache()
+    await ent.send_state(mc, 2)
+    assert mc.publish.call_count == 4
+
+    ent.force_update = True
+    await ent.send_state(mc, 2)
+    assert mc.publish.call_count == 5
+    assert ent.states_suppressed == 3
+
+    # Disabled by default
+    ent2 = MQTTSensorEntity(unique_id="a2", state_topic="/st2", name="test2")
+    await ent2.send_state(mc, 2)
+    await ent2.send_state(mc, 2)
+    assert mc.publish.call_count == 7
+
+
+@pytest.mark.asyncio
+async def test_deadband() -> None:
+    """Test the numeric deadband & min_interval filters."""
+    ent = MQTTSensorEntity(
+        unique_id="p1",
+        state_topic="/power",
+        name="power",
+        deadband=1,
+        min_interval=60,
+        suggested_display_precision=1,
+    )
+    assert "deadband" not in ent.as_discovery_dict
+    mc = AsyncMock(spec=MQTTAsyncClient)
+
+    for val in (100, 101, 99.04, "100.96", 102.5, "unavailable", 50):
+        await ent.send_state(mc, val)
+    assert [c.args[1] for c in mc.publish.call_args_list] == [
+        "100",
+        "102.5",
+        "unavailable",
+        "50",
+    ]
+    assert ent.states_suppressed == 3
+
+    # small changes are published after min_interval
+    ent._last_time -= 60
+    await ent.send_state(mc, 50.5)
+    assert mc.publish.call_args.args[1] == "50.5"
+
+    # percent deadband, without min_interval
+    ent.deadband, ent.deadband_percent, ent.min_interval = 0, 10, 0
+    await ent.send_state(mc, 55.5)
+    await ent.send_state(mc, 55.6)
+    assert mc.publish.call_args.args[1] == "55.6"
+    await ent.send_state(mc, 50.5, force=True)
+    assert mc.publish.call_args.args[1] == "50.5"
+
+
+def test_discovery_payload_cache() -> None:
+    """Test the discovery payload is cached until something changes."""
+    ent = MQTTSensorEntity(name="test1", unique_id="789", state_topic="/test/a")
+    dev = MQTTDevice(identifiers=["123"], components={"789": ent})
+    origin = MQTTOrigin(name="Test Origin")
+
+    topic, payload = dev.discovery_payload("/blah", origin=origin)
+    assert topic == "homeassistant/device/123/config"
+    assert loads(payload) == dev.discovery_info("/blah", origin=origin)[1]
+    assert dev.discovery_payload("/blah", origin=origin)[1] is payload
+
+    # internal fields & states do not invalidate the cache
+    ent.state_cache = True
+    ent.states_suppressed = 5
+    assert dev.discovery_payload("/blah", origin=origin)[1] is payload
+
+    def changed() -> bool:
+        nonlocal payload
+        new = dev.discovery_payload("/blah", origin=origin)[1]
+        res, payload = new is not payload, new
+        return res
+
+    ent.name = "test2"
+    assert changed()
+    assert '"test2"' in payload
+    dev.model = "m1"
+    assert changed()
+    dev.components["790"] = MQTTSensorEntity(name="b", unique_id="790", state_topic="b")
+    assert changed()
+    dev.remove_components["791"] = "sensor"
+    assert changed()
+    # in-place changes
+    ent.discovery_extra["ic"] = "mdi:flash"
+    assert changed()
+    ent.discovery_extra.clear()
+    assert changed()
+    dev.identifiers.append("124")
+    assert changed()
+    options = ["a"]
+    dev.components["s"] = MQTTSelectEntity(
+        name="s", unique_id="s", state_topic="s", command_topic="s/set", options=options
+    )
+    assert changed()
+    options.append("b")
+    assert changed()
+    assert '"b"' in payload
+    ent.invalidate_discovery()
+    assert changed()
+    assert not changed()
+    assert dev.discovery_payload("/other", origin=origin)[1] is not payload
+
+
+def test_discovery_dict_abbreviated() -> None:
+    """Test entities are serialized straight to abbreviated keys."""
+    ents: list[MQTTBaseEntity] = [
+        MQTTSensorEntity(
+            name="s",
+            unique_id="s1",
+            state_topic="/s",
+            unit_of_measurement="W",
+            discovery_extra={"state_topic": "/x", "ic": "mdi:flash"},
+        ),
+        MQTTNumberEntity(
+            name="n", unique_id="n1", state_topic="/n", command_topic="/c"
+        ),
+        MQTTDeviceTrigger(type="action", subtype="a", payload="p", topic="/t"),
+    ]
+    for ent in ents:
+        res = ent.discovery_dict(ABBREVIATE)
+        assert res == hass_abbreviate(ent.as_discovery_dict)
+        assert list(res) == list(hass_abbreviate(ent.as_discovery_dict))
+
+    @dataclass
+    class Custom(MQTTSensorEntity):
+        @property
+        def as_discovery_dict(self) -> dict[str, Any]:
+            return {**super().as_discovery_dict, "custom_key": 1}
+
+    dev = MQTTDevice(
+        identifiers=["123"],
+        components={"c": Custom(name="c", unique_id="c", state_topic="/c")},
+    )
+    _, disco = dev.discovery_info("", origin=MQTTOrigin(name="o"))
+    assert disco["cmps"]["c"]["custom_key"] == 1
+
+
+def test_discovery_payloads_split() -> None:
+    """Test splitting the discovery info of a large device."""
+
+    def sensor(idx: int) -> MQTTSensorEntity:
+        return MQTTSensorEntity(name=f"s{idx}", unique_id=f"s{idx}", state_topic="/s")
+
+    dev = MQTTDevice(
+        identifiers=["123"], components={f"s{i}": sensor(i) for i in range(40)}
+    )
+    origin = MQTTOrigin(name="o")
+
+    def parts(max_bytes: int = 1000) -> dict[str, dict[str, Any]]:
+        res = dev.discovery_payloads("/avty", origin=origin, max_bytes=max_bytes)
+        assert all(len(p) <= max_bytes for _, p in res)
+        return {t: loads(p) if p else {} for t, p in res}
+
+    assert len(dev.discovery_payloads("/avty", origin=origin, max_bytes=0)) == 1
+    assert len(dev.discovery_payloads("/avty", origin=origin, max_bytes=100000)) == 1
+
+    res = parts()
+    assert list(res)[:2] == [
+        "homeassistant/device/123/config",
+        "homeassistant/device/123_1/config",
+    ]
+    assert len(res) > 2
+    full = dev.discovery_info("/avty", origin=origin)[1]
+    for part in res.values():
+        assert {k: v for k, v in part.items() if k != "cmps"} == {
+            k: v for k, v in full.items() if k != "cmps"
+        }
+    cmps = {k: v for p in res.values() for k, v in p["cmps"].items()}
+    assert cmps == full["cmps"]
+    assert sum(len(p["cmps"]) for p in res.values()) == 40
+    assert dev.discovery_payloads("/avty", origin=origin, max_bytes=1000) is (
+        dev.discovery_payloads("/avty", origin=origin, max_bytes=1000)
+    )
+
+    # Components stay in their part, removed components are removed from it
+    where = {k: t for t, p in res.items() for k in p["cmps"]}
+    del dev.components["s0"]
+    dev.components["s40"] = sensor(40)
+    s1 = dev.components["s1"]
+    assert isinstance(s1, MQTTSensorEntity)
+    s1.name = "a much longer name " * 10
+    res2 = parts()
+    removed = {
+        k for p in res2.values() for k, v in p["cmps"].items() if v == {"p": "sensor"}
+    }
+    # s1 grew & stays in its part, the last components in the part have to move
+    assert removed == {"s0", "s10", "s11"}
+    assert res2[where["s0"]]["cmps"]["s0"] == {"p": "sensor"}
+    assert "name" in res2[where["s1"]]["cmps"]["s1"]
+    moved_to = next(t for t, p in res2.items() if "name" in p["cmps"].get("s11", {}))
+    assert list(res2).index(where["s11"]) < list(res2).index(moved_to)
+    for key in ("s2", "s20", "s39"):
+        assert key in res2[where[key]]["cmps"]
+
+    # remove_components are removed from the part that holds the component
+    dev.components.pop("s39")
+    dev.remove_components["s39"] = "sensor"
+    res3 = parts()
+    assert res3[where["s39"]]["cmps"]["s39"] == {"p": "sensor"}
+    assert sum("s39" in p["cmps"] for p in res3.values()) == 1
+    del dev.remove_components["s39"]
+
+    # The parts are merged once the device fits, the other parts are cleared
+    for idx in range(2, 41):
+        dev.components.pop(f"s{idx}", None)
+    res4 = parts()
+    assert list(res4)[-1] == "homeassistant/device/123/config"
+    assert all(not p for p in list(res4.values())[:-1])
+    assert len(res4) == len(res2)
+    cmps = res4["homeassistant/device/123/config"]["cmps"]
+    assert {k for k, v in cmps.items() if v != {"p": "sensor"}} == {"s1"}
+    assert len(parts()) == 1
+
+
+def test_restore_discovery_parts() -> None:
+    """Test the split continues from the retained payloads of a previous run."""
+
+    def make_device() -> MQTTDevice:
+        return MQTTDevice(
+            identifiers=["123"],
+            components={
+                f"s{i}": MQTTSensorEntity(
+                    name=f"s{i}", unique_id=f"s{i}", state_topic="/s"
+                )
+                for i in range(20)
+            },
+        )
+
+    origin = MQTTOrigin(name="o")
+    dev = make_device()
+    retained = {
+        t: p.encode()
+        for t, p in dev.discovery_payloads("/avty", origin=origin, max_bytes=1000)
+    }
+    retained["homeassistant/device/1234/config"] = b"{}"  # another device
+    where = {k: t for t, p in retained.items() for k in loads(p).get("cmps", {})}
+    assert len({where["s0"], where["s19"]}) == 2
+
+    # Restart without s3 & s4
+    dev = make_device()
+    del dev.components["s3"]
+    del dev.components["s4"]
+    dev.restore_discovery_parts(retained)
+    res = {
+        t: loads(p)
+        for t, p in dev.discovery_payloads("/avty", origin=origin, max_bytes=1000)
+    }
+    assert res[where["s3"]]["cmps"]["s3"] == {"p": "sensor"}
+    assert res[where["s4"]]["cmps"]["s4"] == {"p": "sensor"}
+    for key in ("s0", "s19"):
+        assert key in res[where[key]]["cmps"]
+        assert sum(key in p["cmps"] for p in res.values()) == 1
+
+    # Not split by the previous run
+    dev = make_device()
+    dev.restore_discovery_parts({"homeassistant/device/123/config": b"{}"})
+    assert not dev._discovery_parts
@@ -1,10 +1,22 @@
 """Test helpers."""
 
+import dataclasses
+import inspect
 import os
+from typing import Any, NamedTuple
 
-from mqtt_entity import MQTTSensorEntity
+from mqtt_entity import (
+    MQTTDevice,
+    MQTTLightEntity,
+    MQTTNumberEntity,
+    MQTTSelectEntity,
+    MQTTSensorEntity,
+)
+from mqtt_entity.device import MQTTOrigin
 from mqtt_entity.helpers import (
+    _SERIALIZERS,
     MQTTEntityOptions,
+    as_dict,
     hass_abbreviate,
     hass_default_rw_icon,
     hass_device_class,
@@ -61,3 +73,106 @@ def test_share_path() -> None:
     """Test path helpers."""
     res = hass_share_path("test-addon", create=False)
     assert res.name == ".data" if os.name == "nt" else "/share/test-addon"
+
+
+def as_dict_reference(obj: Any, metadata_key: str = "") -> dict[str, Any]:
+    """Return the original as_dict, based on dataclasses.asdict."""
+
+    def _filter(atrb: dataclasses.Field, value: Any) -> bool:
+        if not value or atrb.default == value:
+            return False
+        if metadata_key:
+            return bool(atrb.metadata.get(metadata_key))
+        if atrb.metadata.get("internal") or atrb.name == "discovery_extra":
+            return False
+        return not inspect.isfunction(value)
+
+    res = {
+        k: v
+        for k, v in dataclasses.asdict(obj).items()
+        if _filter(obj.__dataclass_fields__[k], v)
+    }
+    res.update(getattr(obj, "discovery_extra", None) or {})
+    return res
+
+
+class Options(NamedTuple):
+    """Select options."""
+
+    first: str
+    second: str
+
+
+def test_as_dict() -> None:
+    """Test the generated serializer matches dataclasses.asdict."""
+
+    async def on_cmd(payload: str, topic: str) -> None:
+        pass
+
+    objs = [
+        MQTTSensorEntity(
+            name="s",
+            unique_id="s1",
+            state_topic="/s",
+            suggested_display_precision=2,
+            force_update=False,
+            state_cache=True,
+            deadband=1,
+            discovery_extra={"name": "x", "ic": "mdi:flash"},
+        ),
+        MQTTNumberEntity(
+            name="n",
+            unique_id="n1",
+            state_topic="/n",
+            command_topic="/n/set",
+            on_command=on_cmd,
+            max=100.0,
+            step=0.5,
+        ),
+        MQTTSelectEntity(
+            name="sel",
+            unique_id="sel1",
+            state_topic="/sel",
+            command_topic="/sel/set",
+            options=("a", "b"),
+        ),
+        MQTTLightEntity(
+            name="l",
+            unique_id="l1",
+            state_topic="/l",
+            command_topic="/l/set",
+            effect_list=["e1", "e2"],
+        ),
+        MQTTOrigin(name="o", sw="1.0"),
+        MQTTSelectEntity(
+            name="sel",
+            unique_id="sel2",
+            state_topic="/sel",
+            command_topic="/sel/set",
+            options=Options("a", "b"),
+        ),
+    ]
+    for obj in objs:
+        res = as_dict(obj)
+        assert res == as_dict_reference(obj)
+        assert list(res) == list(as_dict_reference(obj))  # same order
+
+    light = objs[3]
+    assert as_dict(light)["effect_list"] is not light.effect_list  # type: ignore[union-attr]
+
+    dev = MQTTDevice(
+        identifiers=["d1", ("mac", "aa")], components={}, model="m", qos="1"
+    )
+    for key in ("dev", "shared"):
+        assert as_dict(dev, metadata_key=key) == as_dict_reference(dev, key)
+    assert as_dict(objs[0], exclude=["name"]).get("name") == "x"  # extra
+
+    # abbreviation tables other than the module's are cached by content
+    count = len(_SERIALIZERS)
+    for _ in range(3):
+        assert as_dict(objs[4], abbreviations={"sw": "sw_version"}) == {
+            "name": "o",
+            "sw_version": "1.0",
+        }
+    assert as_dict(objs[4], abbreviations={"sw": "v"})["v"] == "1.0"
+    assert len(_SERIALIZERS) == count + 2
@@ -0,0 +1,44 @@
+"""Test the lazy imports of the package."""
+
+import subprocess
+import sys
+
+import pytest
+
+import mqtt_entity
+
+
+def loaded_after(statement: str) -> list[str]:
+    """Return the heavy dependencies loaded by the statement, in a fresh interpreter."""
+    code = (
+        f"import sys; {statement}; "
+        "print(*sorted({m.split('.')[0] for m in sys.modules} "
+        "& {'paho', 'aiohttp', 'cattrs', 'yaml'}))"
+    )
+    res = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    return res.stdout.split()
+
+
+def test_lazy_imports() -> None:
+    """Test optional & heavy dependencies are imported on first use."""
+    assert loaded_after("import mqtt_entity") == []
+    assert loaded_after("from mqtt_entity import MQTTDevice, MQTTSensorEntity") == []
+    assert loaded_after("from mqtt_entity.options import MQTTOptions") == []
+    assert loaded_after("from mqtt_entity import MQTTClient") == ["paho"]
+    assert loaded_after(
+        "from mqtt_entity.options import MQTTOptions; MQTTOptions().load_dict({})"
+    ) == ["cattrs"]
+
+
+def test_getattr() -> None:
+    """Test the public names."""
+    from mqtt_entity.client import MQTTClient  # noqa: PLC0415
+
+    assert mqtt_entity.MQTTClient is MQTTClient
+    assert set(mqtt_entity.__all__) <= set(dir(mqtt_entity))
+    for name in mqtt_entity.__all__:
+        assert getattr(mqtt_entity, name)
+    with pytest.raises(AttributeError):
+        mqtt_entity.MQTTUnknown  # noqa: B018
@@ -0,0 +1,184 @@
+"""Test the client metrics."""
+
+import asyncio
+import logging
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from paho.mqtt.client import MQTT_ERR_NO_CONN, MQTT_ERR_SUCCESS, Client
+from paho.mqtt.enums import CallbackAPIVersion
+from test_broker import connect, until
+
+from mqtt_entity import MQTTClient
+from mqtt_entity.broker import MQTTBroker
+from mqtt_entity.client import METRIC_SENSORS
+from mqtt_entity.metrics import Histogram, Metrics, prometheus_text
+
+
+def test_histogram() -> None:
+    """Test buckets & the snapshot."""
+    hist = Histogram()
+    for val in (0.00005, 0.002, 0.002, 7):
+        hist.observe(val)
+    snap = hist.snapshot()
+    assert snap["count"] == 4
+    assert snap["max"] == 7
+    assert snap["buckets"]["0.0001"] == 1
+    assert snap["buckets"]["0.005"] == 3
+    assert snap["buckets"]["5.0"] == 3
+    assert snap["buckets"]["inf"] == 4
+
+
+def test_prometheus_text() -> None:
+    """Test the exposition format."""
+    met = Metrics(messages_in=3)
+    met.observe_callback('on_"cmd"', 0.002)
+    met.slow_callbacks["on_cmd"] = 2
+    text = prometheus_text(met.snapshot(pending_tasks=2))
+    assert "# TYPE mqtt_entity_messages_in_total counter\n" in text
+    assert "mqtt_entity_messages_in_total 3\n" in text
+    assert "mqtt_entity_pending_tasks 2\n" in text
+    assert (
+        'mqtt_entity_callback_seconds_bucket{callback="on_\\"cmd\\"",le="+Inf"} 1\n'
+        in text
+    )
+    assert 'mqtt_entity_callback_seconds_count{callback="on_\\"cmd\\""} 1\n' in text
+    assert 'mqtt_entity_connect_seconds_bucket{le="0.001"} 0\n' in text
+    assert 'mqtt_entity_slow_callbacks_total{callback="on_cmd"} 2\n' in text
+    assert "mqtt_entity_loop_lag_seconds_count 0\n" in text
+
+
+async def test_client_metrics(broker: MQTTBroker) -> None:
+    """Test the client counters, callbacks, reconnects & the exporter."""
+    mqc = MQTTClient(clean_entities=0)
+    await connect(broker, mqc)
+    received = list[str]()
+
+    def on_state(payload: str, topic: str) -> None:
+        received.append(payload)
+
+    mqc.topic_subscribe("test/state", on_state)
+    await mqc.publish("test/state", "é")
+    await until(lambda: bool(received))
+
+    met = mqc.metrics
+    assert met["messages_out"] == 1
+    assert met["bytes_out"] == 2
+    assert met["messages_in"] == 1
+    assert met["bytes_in"] == 2
+    assert met["callbacks"]["on_state"]["count"] == 1
+    assert met["connects"] == 1
+    assert met["connect_time"]["count"] == 1
+    assert met["waiting"] == 0
+
+    broker.drop(broker.clients[0])
+    await until(lambda: mqc.metrics["reconnects"] == 1)
+    assert mqc.metrics["connect_time"]["count"] == 2
+
+    server = await mqc.start_metrics_server(port=0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    response = await reader.read()
+    writer.close()
+    server.close()
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"mqtt_entity_reconnects_total 1\n" in response
+    await mqc.disconnect()
+
+
+async def test_messages_out() -> None:
+    """Test only messages handed to paho are counted, once."""
+    with patch("mqtt_entity.client.Client") as paho_client_class:
+        cmock = paho_client_class.return_value = MagicMock(
+            spec=Client(callback_api_version=CallbackAPIVersion.VERSION2)
+        )
+        cmock.is_connected.return_value = False
+        mqc = MQTTClient(write_behind=60)
+        mqc.connect_time = -1  # connection failed
+        await mqc.publish("test/a", "1", buffered=True)
+        await mqc.flush()
+        assert mqc._buffer
+        with pytest.raises(ConnectionError):
+            await mqc.publish("test/b", "1")
+        assert mqc.metrics["messages_out"] == 0
+
+        # QoS 0 fails while disconnected, QoS 1 is queued by paho
+        cmock.is_connected.return_value = True
+        cmock.publish.return_value = MagicMock(rc=MQTT_ERR_NO_CONN, mid=1)
+        await mqc.publish_many([("test/c", "1", 0, False), ("test/d", "é", 1, False)])
+        assert mqc.metrics["messages_out"] == 1
+        assert mqc.metrics["bytes_out"] == 2
+
+        cmock.publish.return_value = MagicMock(rc=MQTT_ERR_SUCCESS, mid=2)
+        await mqc.flush()
+        assert not mqc._buffer
+        assert mqc.metrics["messages_out"] == 2
+        await mqc.disconnect()
+
+
+async def test_metrics_device(broker: MQTTBroker) -> None:
+    """Test the metrics are published as diagnostic sensors."""
+    mqc = MQTTClient(clean_entities=0)
+    dev = mqc.add_metrics_device("addon_metrics", interval=0.05)
+    assert dev in mqc.devs
+    assert len(dev.components) == len(METRIC_SENSORS)
+    sensor = dev.components["addon_metrics_messages_out"]
+    assert sensor.discovery_dict()["entity_category"] == "diagnostic"
+
+    await connect(broker, mqc)
+    states = dict[str, str]()
+    mqc.topic_subscribe("addon_metrics/metrics/+", lambda p, t: states.update({t: p}))
+    await mqc.publish_discovery_info()
+    await until(lambda: len(states) == len(METRIC_SENSORS))
+    assert int(states["addon_metrics/metrics/messages_out"]) > 0
+    assert states["addon_metrics/metrics/connects"] == "1"
+    assert mqc._metrics_task
+    await mqc.disconnect()
+    assert mqc._metrics_task is None
+
+
+async def test_slow_callbacks(
+    broker: MQTTBroker, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test slow & stuck callbacks are reported and the loop lag is measured."""
+    mqc = MQTTClient(
+        clean_entities=0,
+        slow_callback=0.05,
+        slow_async_callback=0.05,
+        loop_lag_interval=0.02,
+        loop_lag_threshold=0.05,
+    )
+    await connect(broker, mqc)
+    assert mqc._probe
+    done = list[str]()
+
+    def on_slow(payload: str, topic: str) -> None:
+        time.sleep(0.2)  # blocks paho's thread
+        done.append(topic)
+
+    async def on_blocking(payload: str, topic: str) -> None:
+        time.sleep(0.2)  # noqa: ASYNC251 blocks the event loop
+        done.append(topic)
+
+    mqc.topic_subscribe("test/slow", on_slow)
+    mqc.topic_subscribe("test/blocking", on_blocking)
+    with caplog.at_level(logging.WARNING):
+        await mqc.publish("test/slow", "1")
+        await until(lambda: len(done) == 1)
+        await mqc.publish("test/blocking", "1")
+        await until(lambda: len(done) == 2)
+        await until(lambda: "Event loop was blocked" in caplog.text)
+
+    assert "Callback on_slow(topic=test/slow) still running" in caplog.text
+    assert "Slow callback on_slow(topic=test/slow) took 0.2" in caplog.text
+    assert "Slow callback on_blocking(topic=test/blocking)" in caplog.text
+    assert "Event loop blocked for more than 0.05s" in caplog.text
+    met = mqc.metrics
+    assert met["slow_callbacks"] == {"on_slow": 1, "on_blocking": 1}
+    assert met["loop_lag"]["max"] >= 0.1
+    assert not mqc._running
+
+    await mqc.disconnect()
+    assert mqc._probe is None
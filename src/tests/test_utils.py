@@ -1,6 +1,6 @@
 """Test utils."""
 
-from mqtt_entity.utils import load_json, slug, tostr
+from mqtt_entity.utils import load_json, slug, tofloat, tostr
 
 
 def test_load_dict() -> None:
@@ -30,3 +30,13 @@ def test_tostr() -> None:
     assert tostr(1.1) == "1.1"
     assert tostr(True) == "ON"
     assert tostr(False) == "OFF"
+
+
+def test_tofloat() -> None:
+    """Test to float."""
+    assert tofloat(1) == 1
+    assert tofloat("1.23456") == 1.235
+    assert tofloat(1.26, 1) == 1.3
+    assert tofloat("on") is None
+    assert tofloat(True) is None
+    assert tofloat(None) is None